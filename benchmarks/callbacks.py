@@ -0,0 +1,80 @@
+import argparse
+import time
+import timeit
+import tracemalloc
+from contextvars import copy_context
+
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+import main
+
+
+def triggered_by(prop_id, callback, *args):
+    """
+    Runs a callback as if the given input had triggered it, so callback_context works outside a request.
+    This follows the approach of the Dash documentation for testing callbacks.
+    """
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': None}]))
+        return callback(*args)
+    return copy_context().run(run)
+
+
+def scenarios():
+    """
+    Returns the callback invocations to measure, as (name, function) pairs.
+    """
+    local_authority = main.df['local_authority_ons_district'].value_counts().index[0]
+    tree_click = {'points': [{'id': 'Weather Conditions - Fine no high winds - Road Conditions - Dry'}]}
+    busiest = main.df[main.df['local_authority_ons_district'] == local_authority]
+    map_click = {'points': [{'lat': busiest['latitude'].median(), 'lon': busiest['longitude'].median()}]}
+    return [
+        ('render_tab_content map', lambda: main.render_tab_content('tab-map')),
+        ('render_tab_content bar', lambda: main.render_tab_content('tab-barchart')),
+        ('update_map aggregated', lambda: main.update_map(None, None, [1, 12], None, 'aggregated')),
+        ('update_map all', lambda: main.update_map(None, None, [1, 12], None, 'all')),
+        ('update_map filtered', lambda: main.update_map(local_authority, 'Slight', [3, 9], tree_click, 'all')),
+        ('update_map density', lambda: main.update_map(None, None, [1, 12], None, 'density')),
+        ('update_map density filtered', lambda: main.update_map(local_authority, 'Slight', [3, 9], tree_click,
+                                                                'density')),
+        ('update_total', lambda: main.update_total(local_authority, 'Slight', [3, 9], None)),
+        ('update_nearby', lambda: main.update_nearby(map_click, None, None, [1, 12], None)),
+        ('line_update', lambda: main.line_update('Time of the Day')),
+        ('line_update filtered', lambda: main.line_update('Age band of Driver', 'Serious', local_authority)),
+        ('update_chart', lambda: triggered_by('vehicle-dropdown.value', main.update_chart,
+                                              'Vehicle Type', None, None, 'Serious', 'all', None)),
+        ('update_heatmap', lambda: main.update_heatmap('Casualty Class', 'Vehicle Manoeuvre', 'excluded')),
+        ('update_heatmap residual', lambda: main.update_heatmap('Casualty Class', 'Vehicle Manoeuvre', 'excluded',
+                                                                'residual')),
+        ('update_association_ranking', lambda: main.update_association_ranking('excluded')),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure peak allocation and latency of the Dash callbacks.')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    dataset_mb = main.df.memory_usage(deep=True).sum() / 1e6
+    print(f'dataset: {len(main.df)} rows, {dataset_mb:.1f} MB')
+    print(f"{'callback':<28}{'peak alloc (MB)':>16}{'time (ms)':>12}{'cached (ms)':>13}")
+    tracemalloc.start()
+    for name, run in scenarios():
+        peaks, timings = [], []
+        for _ in range(args.repeats):
+            # Measure building the output, not the figure cache or the memoized tab layouts
+            main.figure_cache.clear()
+            for build_tab in [main.build_map_tab, main.build_bar_tab, main.build_heat_tab]:
+                build_tab.cache_clear()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        # Repeating the same view is answered from the figure cache
+        cached = min(timeit.repeat(run, number=1, repeat=args.repeats))
+        print(f'{name:<28}{max(peaks) / 1e6:>16.1f}{min(timings) * 1000:>12.1f}{cached * 1000:>13.2f}')
+    tracemalloc.stop()
+    print('figure cache:', main.figure_cache.stats())
@@ -0,0 +1,49 @@
+import argparse
+import timeit
+
+from data.loader import CSV_PATH, read_csv_dataset
+from data.schema import apply_schema
+
+
+# Representative filter and groupby paths of the callbacks in main.py and the chart classes
+OPERATIONS = {
+    'severity ==': lambda data: data[data['accident_severity'] == 'Serious'],
+    'local authority ==': lambda data: data[data['local_authority_ons_district'] == 'Birmingham'],
+    'weather isin': lambda data: data[data['weather_conditions'].isin(['Raining no high winds',
+                                                                        'Raining + high winds'])],
+    'hbar groupby': lambda data: data.groupby(['vehicle_type', 'accident_severity'], observed=True).size(),
+    'heatmap groupby': lambda data: data.groupby(['junction_location', 'junction_control'], observed=True).size(),
+}
+
+
+def benchmark(data, repeats):
+    """
+    Times every operation on the given frame.
+
+    Parameters:
+    - data: The DataFrame to run the operations on.
+    - repeats: Number of timed runs per operation.
+
+    Returns:
+    - Dictionary of operation name to best time in milliseconds.
+    """
+    return {name: min(timeit.repeat(lambda: operation(data), number=1, repeat=repeats)) * 1000
+            for name, operation in OPERATIONS.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare object and categorical label columns.')
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    raw = read_csv_dataset(args.csv)
+    encoded = apply_schema(raw.copy())
+
+    print(f"{'':<24}{'object':>12}{'categorical':>14}")
+    print(f"{'memory (MB)':<24}{raw.memory_usage(deep=True).sum() / 1e6:>12.1f}"
+          f"{encoded.memory_usage(deep=True).sum() / 1e6:>14.1f}")
+    raw_timings = benchmark(raw, args.repeats)
+    encoded_timings = benchmark(encoded, args.repeats)
+    for name in OPERATIONS:
+        print(f'{name + " (ms)":<24}{raw_timings[name]:>12.2f}{encoded_timings[name]:>14.2f}')
@@ -0,0 +1,54 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from data.filters import month_labels
+from data.index import BitmapIndex
+import main
+
+
+def queries(data):
+    """
+    Returns representative filter combinations of the map and bar chart tabs, as (name, selections) pairs.
+    """
+    local_authority = data['local_authority_ons_district'].value_counts().index[0]
+    return [
+        ('severity', {'accident_severity': 'Serious'}),
+        ('local authority', {'local_authority_ons_district': local_authority}),
+        ('months', {'month': month_labels([3, 9])}),
+        ('la + severity + months', {'local_authority_ons_district': local_authority,
+                                    'accident_severity': 'Slight', 'month': month_labels([3, 9])}),
+        ('tree map path', {'weather_conditions': 'Fine no high winds', 'road_surface_conditions': 'Dry',
+                           'speed_limit': '30'}),
+    ]
+
+
+def scan(data, selections):
+    """
+    Answers the selections by scanning the columns, the way the callbacks did before the index.
+    """
+    mask = np.ones(len(data), dtype=bool)
+    for column, values in selections.items():
+        mask &= data[column].isin(values if isinstance(values, list) else [values]).to_numpy()
+    return mask
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the bitmap index with column scans for the filters.')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    data = main.df  # Includes the columns the charts derive at startup, such as month
+    start = timeit.default_timer()
+    index = BitmapIndex(data)
+    print(f'index: {len(data)} rows, built in {timeit.default_timer() - start:.2f}s, '
+          f'{index.memory_usage() / 1e6:.1f} MB')
+
+    print(f"{'query':<26}{'scan (ms)':>12}{'index (ms)':>12}{'rows':>10}")
+    for name, selections in queries(data):
+        expected = scan(data, selections)
+        assert np.array_equal(index.mask(selections), expected), name
+        scan_ms = min(timeit.repeat(lambda: scan(data, selections), number=1, repeat=args.repeats)) * 1000
+        index_ms = min(timeit.repeat(lambda: index.mask(selections), number=1, repeat=args.repeats)) * 1000
+        print(f'{name:<26}{scan_ms:>12.2f}{index_ms:>12.2f}{expected.sum():>10}')
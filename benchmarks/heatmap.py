@@ -0,0 +1,58 @@
+import argparse
+import itertools
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from data.aggregate import contingency
+import main
+
+
+# Options of the heatmap dropdowns, see heatmap_masking() in main.py
+ATTRIBUTES = ['First Point of Impact', 'Pedestrian Movement', 'Junction Location', 'Junction Control',
+              'Casualty Class', 'Vehicle Manoeuvre']
+
+
+def groupby_counts(data, x, y):
+    """
+    Counts the label pairs with a groupby and reindexes them onto every pair of labels, the way HeatMap.update
+    did before the contingency table.
+    """
+    counts = data.groupby([x, y], observed=True).size()
+    index = pd.MultiIndex.from_product([data[x].dropna().unique(), data[y].dropna().unique()], names=[x, y])
+    return counts.reindex(index, fill_value=0).reset_index(name='count')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the heatmap counts with a groupby.')
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'x':<24}{'y':<24}{'rows':>8}{'groupby (ms)':>14}{'bincount (ms)':>15}{'lookup (ms)':>13}"
+          f"{'figure (ms)':>13}")
+    for x_label, y_label in itertools.product(ATTRIBUTES, repeat=2):
+        x, y = main.heatmap_masking(x_label), main.heatmap_masking(y_label)
+        data = main.tables.frame([x, y])
+
+        # Both give the same count for every pair of labels
+        counts, x_labels, y_labels = contingency(data[x], data[y])
+        if x != y:
+            expected = groupby_counts(data, x, y).set_index([x, y])['count']
+            for (i, label_x), (j, label_y) in itertools.product(enumerate(x_labels), enumerate(y_labels)):
+                assert expected.get((label_x, label_y), 0) == counts[j, i], (x, y, label_x, label_y)
+        else:
+            assert np.array_equal(np.diag(counts), data[x].value_counts()[x_labels].to_numpy()), x
+        # The precomputed pair counts give the same matrix without reading the rows
+        assert np.array_equal(main.heatmap_pairs.matrix(x, y)[0], counts), (x, y)
+
+        def measure(function):
+            return min(timeit.repeat(function, number=1, repeat=args.repeats)) * 1000
+
+        # The groupby fails when both axes are the same column
+        groupby_ms = measure(lambda: groupby_counts(data, x, y)) if x != y else float('nan')
+        bincount_ms = measure(lambda: contingency(data[x], data[y]))
+        lookup_ms = measure(lambda: main.heatmap_pairs.matrix(x, y))
+        figure_ms = measure(lambda: main.build_heatmap_figure(x, y, False))
+        print(f'{x_label:<24}{y_label:<24}{len(data):>8}{groupby_ms:>14.2f}{bincount_ms:>15.2f}{lookup_ms:>13.2f}'
+              f'{figure_ms:>13.2f}')
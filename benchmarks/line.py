@@ -0,0 +1,27 @@
+import argparse
+import timeit
+
+import main
+
+
+# Options of the line chart dropdown and the column each one shows on the x-axis
+MODES = [('Time of the Day', 'hour'), ('Day of the Week', 'day_of_week'), ('Month of the Year', 'month'),
+         ('Age band of Driver', 'age_band_of_driver'), ('Speed Limit', 'speed_limit')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the latency of the line chart for every x-axis mode.')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'x-axis':<22}{'rows':>10}{'frame (ms)':>12}{'chart (ms)':>12}{'total (ms)':>12}")
+    for name, column in MODES:
+        columns = [column, 'accident_severity', 'number_of_casualties']
+        data = main.tables.frame(columns)
+        before = {key: data[key].copy() for key in columns}
+
+        frame_ms = min(timeit.repeat(lambda: main.tables.frame(columns), number=1, repeat=args.repeats)) * 1000
+        chart_ms = min(timeit.repeat(lambda: main.line.update(data, column), number=1, repeat=args.repeats)) * 1000
+        # The chart reads the columns of the shared tables, it must leave them as they are
+        assert list(data.columns) == columns and all(data[key].equals(before[key]) for key in columns), name
+        print(f'{name:<22}{len(data):>10}{frame_ms:>12.2f}{chart_ms:>12.2f}{frame_ms + chart_ms:>12.2f}')
@@ -0,0 +1,56 @@
+import argparse
+import json
+import time
+
+import plotly.io as pio
+
+import main
+from data.filters import select
+from data.viewport import MAX_MAP_POINTS
+
+
+def viewports(data):
+    """
+    Returns the visible areas to measure, as (name, bounds) pairs: the whole map and a city sized area around
+    the busiest local authority.
+    """
+    local_authority = data['local_authority_ons_district'].value_counts().index[0]
+    rows = data[data['local_authority_ons_district'] == local_authority]
+    latitude, longitude = rows['latitude'].median(), rows['longitude'].median()
+    return [('whole map', None),
+            ('city', [longitude - 0.25, latitude - 0.125, longitude + 0.25, latitude + 0.125])]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the map payload of the 'all' display option.")
+    parser.add_argument('--max-points', type=int, default=MAX_MAP_POINTS)
+    args = parser.parse_args()
+
+    data = select(main.df, None, main.map_columns)
+    print(f"{'viewport':<12}{'decimation':<12}{'points':>10}{'payload (MB)':>14}{'build (ms)':>12}{'decode (ms)':>13}")
+    for name, bounds in viewports(data):
+        for label, max_points in [('off', None), ('on', args.max_points)]:
+            start = time.perf_counter()
+            fig = main.map.update(data, None, 'all', bounds=bounds, max_points=max_points)
+            payload = pio.to_json(fig)
+            built = time.perf_counter() - start
+            # Decoding the payload stands in for the browser side, which cannot be measured here
+            start = time.perf_counter()
+            json.loads(payload)
+            decoded = time.perf_counter() - start
+            points = sum(len(trace.lat) for trace in fig.data)
+            print(f'{name:<12}{label:<12}{points:>10}{len(payload) / 1e6:>14.1f}{built * 1000:>12.0f}'
+                  f'{decoded * 1000:>13.0f}')
+
+        # The 'density' display option sends grid cells, at the level of the national and of a city zoom
+        level = main.map_grid.level(4.6 if bounds is None else 11)
+        start = time.perf_counter()
+        cells = main.map_grid.cells(None, bounds, level)
+        fig = main.map.update(data, None, 'density', bounds=bounds, cells=cells)
+        payload = pio.to_json(fig)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        json.loads(payload)
+        decoded = time.perf_counter() - start
+        print(f"{name:<12}{'density':<12}{len(cells):>10}{len(payload) / 1e6:>14.1f}{built * 1000:>12.0f}"
+              f'{decoded * 1000:>13.0f}')
@@ -0,0 +1,87 @@
+import argparse
+import multiprocessing
+import resource
+
+from data.loader import CSV_PATH, COLUMNAR_PATH, has_columnar, read_csv_tables, read_columnar_tables
+
+
+def memory_usage():
+    """
+    Reads the memory counters of the current process.
+
+    Returns:
+    - Dictionary with peak RSS and, on Linux, proportional (PSS), private and shared resident memory in MB.
+    """
+    # ru_maxrss is reported in kilobytes on Linux
+    usage = {'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            # The first line is the address range header of the rollup
+            fields = dict(line.split(':', 1) for line in f.readlines()[1:])
+    except OSError:
+        return usage
+
+    def mb(*names):
+        return sum(int(fields[name].split()[0]) for name in names if name in fields) / 1024
+
+    usage['pss'] = mb('Pss')
+    usage['private'] = mb('Private_Clean', 'Private_Dirty')
+    usage['shared'] = mb('Shared_Clean', 'Shared_Dirty')
+    return usage
+
+
+def worker(path, kind, barrier, results):
+    """
+    Loads the dataset like an app worker does and touches every column, then reports its memory.
+    The barrier keeps all workers alive at the same time, so shared pages are counted as shared.
+    """
+    tables = read_columnar_tables(path) if kind == 'columnar' else read_csv_tables(path)
+    for table in tables.tables.values():
+        for column in table.columns:
+            # A value count reads every row of the column, like the chart callbacks do
+            table[column].value_counts(dropna=False)
+    barrier.wait()
+    results.put(memory_usage())
+    barrier.wait()
+
+
+def measure(path, kind, workers):
+    """
+    Starts a number of worker processes that each load the dataset.
+
+    Parameters:
+    - path: Path to the CSV file or the columnar directory.
+    - kind: 'csv' or 'columnar'.
+    - workers: Number of concurrent worker processes.
+
+    Returns:
+    - List with the memory counters of every worker.
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(path, kind, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    usages = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return usages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report per-worker memory of the CSV and memory-mapped load paths.')
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--columnar', default=COLUMNAR_PATH)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    if not has_columnar(args.columnar):
+        raise SystemExit(f'No columnar build at {args.columnar}, run `python -m data.build` first')
+
+    print(f"{'path':<10}{'peak RSS':>10}{'PSS':>10}{'private':>10}{'shared':>10}  (MB per worker, mean of {args.workers})")
+    for kind, path in (('csv', args.csv), ('columnar', args.columnar)):
+        usages = measure(path, kind, args.workers)
+        mean = {key: sum(usage.get(key, 0) for usage in usages) / len(usages) for key in usages[0]}
+        print(f"{kind:<10}{mean['peak_rss']:>10.0f}{mean.get('pss', 0):>10.0f}"
+              f"{mean.get('private', 0):>10.0f}{mean.get('shared', 0):>10.0f}")
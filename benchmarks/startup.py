@@ -0,0 +1,46 @@
+import argparse
+import statistics
+import time
+
+from data.loader import CSV_PATH, COLUMNAR_PATH, has_columnar, read_csv_tables, read_columnar_tables
+
+
+def time_loader(loader, path, repeats):
+    """
+    Times a dataset loader.
+
+    Parameters:
+    - loader: Function that loads the tables of the dataset from a path.
+    - path: Path passed to the loader.
+    - repeats: Number of timed runs.
+
+    Returns:
+    - List of wall-clock timings in seconds.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        loader(path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare dataset load time of the CSV and the columnar build.')
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--columnar', default=COLUMNAR_PATH)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if not has_columnar(args.columnar):
+        raise SystemExit(f'No columnar build at {args.columnar}, run `python -m data.build` first')
+
+    results = {
+        'csv': time_loader(read_csv_tables, args.csv, args.repeats),
+        'columnar': time_loader(read_columnar_tables, args.columnar, args.repeats),
+    }
+    print(f"{'path':<10}{'min (s)':>10}{'median (s)':>12}")
+    for name, timings in results.items():
+        print(f'{name:<10}{min(timings):>10.3f}{statistics.median(timings):>12.3f}')
+    speedup = statistics.median(results['csv']) / statistics.median(results['columnar'])
+    print(f'columnar load is {speedup:.1f}x faster')
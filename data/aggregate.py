@@ -0,0 +1,83 @@
+import numpy as np
+
+from data.schema import codes_of
+
+
+def category_counts(groups, codes, n_groups, n_categories, weights=None):
+    """
+    Counts the categories within every group, as a (group x category) matrix.
+
+    Parameters:
+    - groups: Integer group code per entry (-1 for missing).
+    - codes: Integer category code per entry (-1 for missing), e.g. the codes of a Categorical.
+    - n_groups: Number of groups.
+    - n_categories: Number of categories.
+    - weights: Optional weight per entry, counted instead of 1.
+
+    Returns:
+    - A numpy array of shape (n_groups, n_categories). Entries with a missing group or category are skipped.
+    """
+    valid = (groups >= 0) & (codes >= 0)
+    cells = groups[valid].astype(np.int64) * n_categories + codes[valid]
+    if weights is not None:
+        weights = weights[valid]
+    counts = np.bincount(cells, weights=weights, minlength=n_groups * n_categories)
+    return counts.reshape(n_groups, n_categories)
+
+
+def sum_counts(groups, counts, n_groups):
+    """
+    Adds up the rows of a (row x category) count matrix per group.
+
+    Parameters:
+    - groups: Integer group code per row (-1 for missing).
+    - counts: Count matrix with one row per entry of groups.
+    - n_groups: Number of groups.
+
+    Returns:
+    - A numpy array of shape (n_groups, number of categories).
+    """
+    n_categories = counts.shape[1]
+    return category_counts(np.repeat(groups, n_categories), np.tile(np.arange(n_categories), len(groups)),
+                           n_groups, n_categories, weights=counts.ravel())
+
+
+def groupwise_mode(counts):
+    """
+    Finds the most common category of every group from its count matrix.
+
+    Ties go to the first category, which is what Series.mode()[0] returns for a Categorical,
+    since mode() sorts its result in category order.
+
+    Parameters:
+    - counts: A (group x category) count matrix, see category_counts().
+
+    Returns:
+    - Integer category code per group, -1 for groups without any category.
+    """
+    if counts.shape[1] == 0:
+        return np.full(counts.shape[0], -1)
+    mode = counts.argmax(axis=1)
+    mode[counts.max(axis=1) == 0] = -1
+    return mode
+
+
+def contingency(x, y):
+    """
+    Counts the rows of every pair of labels of two label columns, as a dense matrix built in one pass.
+
+    Parameters:
+    - x, y: Series of labels of the same length, Categoricals or any values pandas can categorize.
+
+    Returns:
+    - A numpy array of shape (number of y labels, number of x labels), with one row per y label as go.Heatmap
+      expects its z values.
+    - The x labels and the y labels, those that occur in a row without a missing value, in category order.
+    """
+    (x_codes, x_labels), (y_codes, y_labels) = codes_of(x), codes_of(y)
+    counts = category_counts(y_codes, x_codes, len(y_labels), len(x_labels))
+
+    # Labels that occur are shown even when all their pairs have a missing value, their row or column is zeros
+    x_present = np.flatnonzero(np.bincount(x_codes[x_codes >= 0], minlength=len(x_labels)))
+    y_present = np.flatnonzero(np.bincount(y_codes[y_codes >= 0], minlength=len(y_labels)))
+    return counts[np.ix_(y_present, x_present)], x_labels[x_present], y_labels[y_present]
@@ -0,0 +1,118 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from data.pairs import HEATMAP_COLUMNS
+
+
+# Measures of the association of two labels the heatmap can show instead of the counts
+MEASURES = ['count', 'residual', 'pmi']
+
+
+def expected_counts(counts):
+    """
+    Computes the counts expected if the two attributes were independent, from the row and column totals.
+
+    Parameters:
+    - counts: A (y label x x label) count matrix, see contingency() in data/aggregate.py.
+
+    Returns:
+    - A float array of the shape of counts.
+    """
+    counts = np.asarray(counts, dtype=float)
+    total = counts.sum()
+    if total == 0:
+        return np.zeros_like(counts)
+    return np.outer(counts.sum(axis=1), counts.sum(axis=0)) / total
+
+
+def standardized_residuals(counts):
+    """
+    Computes the standardized (Pearson) residual of every pair of labels, (observed - expected) / sqrt(expected).
+    Pairs that occur much more often than under independence get large positive values.
+
+    Parameters:
+    - counts: A (y label x x label) count matrix.
+
+    Returns:
+    - A float array of the shape of counts, NaN where no count is expected.
+    """
+    expected = expected_counts(counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(expected > 0, (counts - expected) / np.sqrt(expected), np.nan)
+
+
+def pointwise_mutual_information(counts):
+    """
+    Computes the pointwise mutual information of every pair of labels, log2(observed / expected) in bits.
+
+    Parameters:
+    - counts: A (y label x x label) count matrix.
+
+    Returns:
+    - A float array of the shape of counts, NaN for pairs that do not occur.
+    """
+    expected = expected_counts(counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where((counts > 0) & (expected > 0), np.log2(counts / expected), np.nan)
+
+
+def cramers_v(counts):
+    """
+    Computes Cramér's V of two attributes, the strength of their association from 0 (independent) to 1.
+
+    Parameters:
+    - counts: A (y label x x label) count matrix.
+
+    Returns:
+    - Cramér's V as a float, 0 when an attribute has a single label or there are no counts.
+    """
+    counts = np.asarray(counts, dtype=float)
+    total = counts.sum()
+    k = min(counts.shape)
+    if total == 0 or k < 2:
+        return 0.0
+    expected = expected_counts(counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chi2 = np.where(expected > 0, (counts - expected) ** 2 / expected, 0).sum()
+    return float(np.sqrt(chi2 / (total * (k - 1))))
+
+
+def association(counts, measure):
+    """
+    Computes a measure of the association of every pair of labels.
+
+    Parameters:
+    - counts: A (y label x x label) count matrix.
+    - measure: One of MEASURES, 'count' returns the counts themselves.
+
+    Returns:
+    - An array of the shape of counts.
+    """
+    if measure == 'residual':
+        return standardized_residuals(counts)
+    if measure == 'pmi':
+        return pointwise_mutual_information(counts)
+    return counts
+
+
+def rank_associations(pairs, columns=HEATMAP_COLUMNS, **selections):
+    """
+    Ranks the pairs of attributes by the strength of their association.
+
+    Parameters:
+    - pairs: A PairCounts, see data/pairs.py.
+    - columns: The attributes to pair.
+    - selections: The arguments of PairCounts.matrix() other than the columns, e.g. drop or local_authority.
+
+    Returns:
+    - DataFrame with the two attributes, their Cramér's V and the number of rows counted of every pair of
+      distinct attributes, from the strongest association to the weakest.
+    """
+    rows = []
+    for x, y in itertools.combinations(columns, 2):
+        counts = pairs.matrix(x, y, **selections)[0]
+        rows.append({'x': x, 'y': y, 'cramers_v': cramers_v(counts), 'count': int(counts.sum())})
+    ranking = pd.DataFrame(rows, columns=['x', 'y', 'cramers_v', 'count'])
+    return ranking.sort_values('cramers_v', ascending=False, kind='stable').reset_index(drop=True)
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from data.loader import CSV_PATH, COLUMNAR_PATH, META_FILE, file_hash, read_csv_tables, sort_by_date
+from data.pairs import PAIRS_FILE, count_pairs
+
+
+def _column_file(index):
+    """
+    Returns the file name used for the column at the given position.
+    Column names are not used directly since some of them are not valid file names.
+    """
+    return f'{index:03d}.npy'
+
+
+def write_columnar(data, path):
+    """
+    Writes one table as a typed columnar directory.
+
+    Every column is written to its own .npy file. Numeric columns keep their dtype, while text columns are
+    dictionary encoded: the file holds the integer codes and meta.json holds the labels in code order (-1 marks
+    a missing value). Categorical columns keep the category order they have, e.g. the one of data/schema.py.
+
+    Parameters:
+    - data: The DataFrame to write.
+    - path: Directory to write to, it must exist.
+
+    Returns:
+    - The metadata written to meta.json.
+    """
+    meta = {'rows': len(data), 'columns': []}
+    for index, name in enumerate(data.columns):
+        column = {'name': name, 'file': _column_file(index)}
+        values = data[name]
+        if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object:
+            encoded = pd.Categorical(values)
+            column['kind'] = 'category'
+            column['categories'] = [str(label) for label in encoded.categories]
+            array = encoded.codes
+        else:
+            column['kind'] = 'numeric'
+            array = values.to_numpy()
+        column['dtype'] = str(array.dtype)
+        np.save(os.path.join(path, column['file']), array)
+        meta['columns'].append(column)
+
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def build_columnar(csv_path=CSV_PATH, columnar_path=COLUMNAR_PATH):
+    """
+    Converts the merged collision CSV into typed columnar tables.
+
+    The merged rows are split into the collision, vehicle and casualty tables (see data/tables.py), with the label
+    columns encoded following data/schema.py and the collisions sorted by month (see sort_by_date), and every table
+    is written to its own subdirectory with write_columnar(). The meta.json at the top lists the tables and the
+    hash of the CSV, and pairs.npz holds the counts of the heatmap attribute pairs.
+
+    Parameters:
+    - csv_path: Path to the merged collision CSV file.
+    - columnar_path: Directory to write the columnar build to.
+
+    Returns:
+    - The metadata written to the top meta.json, with the metadata of every table.
+    """
+    # Collisions are written sorted by month, so the app can memory-map them without sorting them again
+    tables = sort_by_date(read_csv_tables(csv_path))
+
+    # Write into a temporary directory first so a running app never sees a half-written build
+    tmp_path = f'{columnar_path}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    # The hash of the source identifies the dataset, e.g. for the figure cache (see dataset_hash)
+    meta = {'source_hash': file_hash(csv_path), 'tables': list(tables.tables)}
+    for name, table in tables.tables.items():
+        os.makedirs(os.path.join(tmp_path, name))
+        write_columnar(table, os.path.join(tmp_path, name))
+    # Counts of the heatmap attribute pairs, so the heatmap tab never reads the rows (see data/pairs.py)
+    count_pairs(tables).save(os.path.join(tmp_path, PAIRS_FILE))
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(columnar_path, ignore_errors=True)
+    os.rename(tmp_path, columnar_path)
+    return dict(meta, tables={name: {'rows': len(table), 'columns': len(table.columns)}
+                              for name, table in tables.tables.items()})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the columnar version of the merged collision data.')
+    parser.add_argument('--csv', default=CSV_PATH, help='merged CSV produced by the cleaning notebook')
+    parser.add_argument('--out', default=COLUMNAR_PATH, help='output directory for the columnar build')
+    args = parser.parse_args()
+
+    meta = build_columnar(args.csv, args.out)
+    for name, table in meta['tables'].items():
+        print(f"Wrote {table['rows']} rows and {table['columns']} columns of the {name} table to {args.out}/{name}")
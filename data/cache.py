@@ -0,0 +1,290 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from plotly.io.json import from_json_plotly, to_json_plotly
+
+
+# Failures of the on-disk store are logged here, they never reach the callbacks
+logger = logging.getLogger(__name__)
+# Default byte budget of the figure cache, a map figure of every collision takes several MB
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+# Defaults of the on-disk store shared by the worker processes of a host
+DEFAULT_CACHE_PATH = 'figure_cache.sqlite'
+DEFAULT_TTL = 24 * 60 * 60
+# Version of the figures, part of the namespace of every cache. Bump it whenever a figure builder changes its
+# output (traces, axes, labels, counting grain), so that figures stored by the previous code are never served.
+CACHE_VERSION = 4
+
+
+def cache_key(*parts):
+    """
+    Builds a hashable cache key from normalized callback inputs, lists (e.g. selected values) become tuples.
+
+    Parameters:
+    - parts: The inputs that determine the output, starting with the name of the chart.
+
+    Returns:
+    - A tuple usable as a dictionary key.
+    """
+    return tuple(cache_key(*sorted(part)) if isinstance(part, set) else
+                 cache_key(*part) if isinstance(part, (list, tuple)) else part for part in parts)
+
+
+class FigureCache(ABC):
+    """
+    Base class of the caches of serialized callback outputs (figures and the values next to them).
+
+    Entries are stored as JSON (encoded by Plotly, with orjson when it is installed), so a cached view costs
+    one JSON decode and no pandas or Plotly work, and the memory they take is known exactly. Subclasses
+    decide where the entries live and which are evicted once the byte budget is exceeded.
+    """
+
+    def __init__(self, namespace='', max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Initializes the counters.
+
+        Parameters:
+        - namespace: Prefix of every key, e.g. the content hash of the dataset so that figures of another
+          dataset are never served.
+        - max_bytes: Byte budget of the serialized entries. Outputs larger than the budget are not stored.
+        """
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def _read(self, key):
+        """
+        Returns the payload stored for key, or None.
+        """
+
+    @abstractmethod
+    def _write(self, key, payload):
+        """
+        Stores the payload for key and evicts entries to stay within the byte budget.
+        """
+
+    def get(self, key):
+        """
+        Looks up an entry.
+
+        Parameters:
+        - key: Hashable key, built from the normalized callback inputs.
+
+        Returns:
+        - The deserialized output, or None when the key is not cached.
+        """
+        payload = self._read(key)
+        if payload is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return from_json_plotly(payload)
+
+    def put(self, key, value):
+        """
+        Stores an output.
+
+        Parameters:
+        - key: Hashable key, built from the normalized callback inputs.
+        - value: Figure, or list/tuple of figures and JSON serializable values.
+        """
+        payload = to_json_plotly(value).encode()
+        if len(payload) <= self.max_bytes:
+            self._write(key, payload)
+
+    def cached(self, key, build):
+        """
+        Returns the cached output for key, or builds, stores and returns it.
+
+        Parameters:
+        - key: Hashable key, built from the normalized callback inputs.
+        - build: Function without arguments that computes the output on a miss.
+
+        Returns:
+        - The output. Tuples come back as lists on a hit, which Dash accepts for multiple outputs too.
+        """
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of this process.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        """
+        Drops all entries of the namespace and resets the counters.
+        """
+        self.hits = self.misses = 0
+
+
+class MemoryFigureCache(FigureCache):
+    """
+    A least recently used cache held in the memory of one process. It is safe to use from several threads.
+    """
+
+    def __init__(self, namespace='', max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(namespace, max_bytes)
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def _write(self, key, payload):
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= len(self._entries.pop(key))
+            self._entries[key] = payload
+            self.nbytes += len(payload)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return dict(super().stats(), entries=len(self._entries), bytes=self.nbytes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+        super().clear()
+
+
+class SQLiteFigureCache(FigureCache):
+    """
+    A cache in an SQLite file, shared by all worker processes of a host and kept across restarts.
+
+    Entries expire after a time to live, and once the byte budget is exceeded the least recently used entries
+    are evicted, whichever process wrote them. Errors of the store are treated as misses, so a locked or
+    read-only file slows the app down but never breaks it. Failed writes and evictions are logged as warnings,
+    since a store that can no longer evict grows past its budget.
+    """
+
+    def __init__(self, namespace='', max_bytes=DEFAULT_MAX_BYTES, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL):
+        """
+        Initializes the cache, the file is opened on first use.
+
+        Parameters:
+        - namespace: Prefix of every key, see FigureCache.
+        - max_bytes: Byte budget of the serialized entries of all processes.
+        - path: Path to the SQLite file.
+        - ttl: Seconds after which an entry expires.
+        """
+        super().__init__(namespace, max_bytes)
+        self.path = path
+        self.ttl = ttl
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """
+        Returns the connection of this process. Worker processes forked from the app open their own one.
+        """
+        if self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            # WAL lets readers of the other workers go on while one of them writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS figures (key TEXT PRIMARY KEY, namespace TEXT, '
+                               'payload BLOB, size INTEGER, created REAL, accessed REAL)')
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def _row_key(self, key):
+        """
+        Turns a key into the text stored in the table, the repr of normalized inputs is stable across processes.
+        """
+        return hashlib.blake2b(repr((self.namespace, key)).encode(), digest_size=16).hexdigest()
+
+    def _read(self, key):
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                row = connection.execute('SELECT payload FROM figures WHERE key = ? AND created >= ?',
+                                         (self._row_key(key), now - self.ttl)).fetchone()
+                if row is None:
+                    return None
+                connection.execute('UPDATE figures SET accessed = ? WHERE key = ?', (now, self._row_key(key)))
+        except sqlite3.Error as error:
+            logger.debug('Figure cache read from %s failed: %s', self.path, error)
+            return None
+        return row[0]
+
+    def _write(self, key, payload):
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute('INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?, ?, ?)',
+                                   (self._row_key(key), self.namespace, payload, len(payload), now, now))
+                connection.execute('DELETE FROM figures WHERE created < ?', (now - self.ttl,))
+                # Keep the most recently used entries that fit in the budget
+                connection.execute('DELETE FROM figures WHERE key IN (SELECT key FROM (SELECT key, SUM(size) '
+                                   'OVER (ORDER BY accessed DESC, key) AS total FROM figures) WHERE total > ?)',
+                                   (self.max_bytes,))
+        except sqlite3.Error as error:
+            logger.warning('Figure cache write or eviction in %s failed: %s', self.path, error)
+
+    def stats(self):
+        try:
+            with self._lock:
+                entries, nbytes = self._connect().execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM figures WHERE namespace = ?',
+                    (self.namespace,)).fetchone()
+        except sqlite3.Error:
+            entries, nbytes = None, None
+        return dict(super().stats(), entries=entries, bytes=nbytes, path=self.path)
+
+    def clear(self):
+        try:
+            with self._lock:
+                self._connect().execute('DELETE FROM figures WHERE namespace = ?', (self.namespace,))
+        except sqlite3.Error as error:
+            logger.warning('Figure cache clear of %s failed: %s', self.path, error)
+        super().clear()
+
+
+def open_figure_cache(namespace=''):
+    """
+    Creates the figure cache configured by the environment:
+
+    - FIGURE_CACHE: 'sqlite' (default) for the store shared by the workers of a host, 'memory' for one per process.
+    - FIGURE_CACHE_PATH: Path to the SQLite file.
+    - FIGURE_CACHE_BYTES: Byte budget.
+    - FIGURE_CACHE_TTL: Seconds after which an entry of the SQLite store expires.
+
+    Parameters:
+    - namespace: Prefix of every key, e.g. the content hash of the dataset. CACHE_VERSION is prepended to it.
+
+    Returns:
+    - A FigureCache.
+    """
+    namespace = f'v{CACHE_VERSION}/{namespace}'
+    backend = os.environ.get('FIGURE_CACHE', 'sqlite')
+    max_bytes = int(os.environ.get('FIGURE_CACHE_BYTES', DEFAULT_MAX_BYTES))
+    if backend == 'memory':
+        return MemoryFigureCache(namespace, max_bytes)
+    if backend == 'sqlite':
+        return SQLiteFigureCache(namespace, max_bytes, path=os.environ.get('FIGURE_CACHE_PATH', DEFAULT_CACHE_PATH),
+                                 ttl=float(os.environ.get('FIGURE_CACHE_TTL', DEFAULT_TTL)))
+    raise ValueError(f"Unknown figure cache backend '{backend}', use 'sqlite' or 'memory'")
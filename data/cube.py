@@ -0,0 +1,254 @@
+import numpy as np
+import pandas as pd
+
+from data.aggregate import category_counts, groupwise_mode, sum_counts
+from data.filters import normalize_selection
+from data.index import FILTER_COLUMNS
+from data.schema import codes_of
+
+
+# Dimensions of the prefix sums of the totals, the last one is accumulated so that a range of it is one subtraction
+TOTAL_DIMENSIONS = ['local_authority_ons_district', 'accident_severity', 'month']
+# Measures the prefix sums are kept for
+TOTAL_MEASURES = ['count', 'number_of_casualties']
+
+
+class DataCube:
+    """
+    Pre-aggregated measures of the dataset for the 'Aggregated' map display mode, built once at startup.
+
+    The base cube has one cell per observed combination of the filter columns (the same dimensions as the
+    BitmapIndex) and stores the row count, casualty sum, latitude/longitude sums and per-severity row counts
+    of that cell. Every measure is additive, so an aggregation over any filter selection is a sum over the
+    matching cells, whose number depends on the label cardinalities and not on the number of rows.
+
+    Totals over the local authority, severity and month selections of the map tab are answered from prefix sums
+    (see _prefix_sums), in a constant number of lookups per selection.
+    """
+
+    def __init__(self, data, dimensions=FILTER_COLUMNS, by='local_authority_ons_district'):
+        """
+        Builds the base cube.
+
+        Parameters:
+        - data: The DataFrame to aggregate.
+        - dimensions: The columns a selection can filter on.
+        - by: The column the aggregated view groups by, it must be one of the dimensions.
+        """
+        self.by = by
+        self.labels = {}
+        codes = {}
+        for column in dimensions:
+            codes[column], self.labels[column] = codes_of(data[column])
+        severity_codes, self.severities = codes_of(data['accident_severity'])
+
+        latitude = data['latitude'].to_numpy(dtype=float)
+        longitude = data['longitude'].to_numpy(dtype=float)
+        casualties = data['number_of_casualties'].to_numpy(dtype=float)
+        measures = {
+            'count': np.ones(len(data)),
+            'number_of_casualties': np.nan_to_num(casualties),
+            'latitude': np.nan_to_num(latitude),
+            'latitude_count': ~np.isnan(latitude),
+            'longitude': np.nan_to_num(longitude),
+            'longitude_count': ~np.isnan(longitude),
+        }
+
+        self.cells, inverse = self._group(codes, measures)
+        self.cells['severity'] = category_counts(inverse, severity_codes, len(self.cells['count']),
+                                                 len(self.severities))
+        self._rollups = {}
+        self.prefix = self._prefix_sums(TOTAL_DIMENSIONS)
+
+    @staticmethod
+    def _group(codes, measures):
+        """
+        Sums the measures over every observed combination of the given codes.
+
+        Parameters:
+        - codes: Dictionary of column name to an integer code array (-1 for missing).
+        - measures: Dictionary of measure name to an array of the same length, or to a count matrix
+          with one row per entry.
+
+        Returns:
+        - Dictionary of column and measure name to one array entry (or matrix row) per combination.
+        - The combination of every entry.
+        """
+        # Combine the codes into one mixed radix key per row, shifted by one so missing values get their own digit
+        key = np.zeros(len(next(iter(measures.values()))), dtype=np.int64)
+        for column, values in codes.items():
+            key = key * (int(values.max(initial=-1)) + 2) + (values.astype(np.int64) + 1)
+        keys, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+
+        cells = {column: values[first] for column, values in codes.items()}
+        for name, values in measures.items():
+            if values.ndim == 2:
+                cells[name] = sum_counts(inverse, values, len(keys))
+            else:
+                cells[name] = np.bincount(inverse, weights=values, minlength=len(keys))
+        return cells, inverse
+
+    def _rollup(self, dimensions):
+        """
+        Returns the cube rolled up onto the grouping column and the given dimensions, computed once per set.
+        """
+        dimensions = tuple(sorted(set(dimensions) - {self.by}))
+        if dimensions not in self._rollups:
+            codes = {column: self.cells[column] for column in (self.by,) + dimensions}
+            measures = {name: values for name, values in self.cells.items() if name not in self.labels}
+            self._rollups[dimensions] = self._group(codes, measures)[0]
+        return self._rollups[dimensions]
+
+    def _prefix_sums(self, dimensions):
+        """
+        Sums the measures of the totals over every combination of labels of the dimensions, accumulated along
+        the last one.
+
+        Every dimension but the last gets an extra slot after its labels that holds the sum over all of them,
+        missing values included, so no selection on it is one lookup too. Along the last dimension, entry i holds
+        the sum of the labels before i, and the extra slot at the end adds the rows with a missing value.
+
+        Parameters:
+        - dimensions: The dimensions of the cube to sum over.
+
+        Returns:
+        - Dictionary of measure name to an array with len(labels) + 1 entries for the leading dimensions and
+          len(labels) + 2 for the last one.
+        """
+        *leading, last = dimensions
+        shape = [len(self.labels[column]) + 1 for column in dimensions]
+        sums = {name: np.zeros(shape) for name in TOTAL_MEASURES}
+        # Missing values of the last dimension go to the slot at the end, those of the others only to the totals
+        codes = [self.cells[column] for column in leading] + [np.where(self.cells[last] >= 0, self.cells[last],
+                                                                       shape[-1] - 1)]
+        for combination in range(1 << len(leading)):
+            # Every subset of the leading dimensions is summed into the slot of all labels
+            index = [np.full(len(codes[0]), shape[i] - 1) if combination >> i & 1 else codes[i]
+                     for i in range(len(leading))] + [codes[-1]]
+            keep = np.logical_and.reduce([values >= 0 for values in index])
+            for name in TOTAL_MEASURES:
+                np.add.at(sums[name], tuple(values[keep] for values in index), self.cells[name][keep])
+        return {name: np.concatenate([np.zeros(shape[:-1] + [1]), np.cumsum(values, axis=-1)], axis=-1)
+                for name, values in sums.items()}
+
+    def _filters(self, selections):
+        """
+        Translates selections into the codes of the selected labels.
+
+        Returns:
+        - List of (column, integer code array) pairs, without the empty selections.
+        """
+        filters = []
+        for column, values in normalize_selection(selections):
+            labels = self.labels[column]
+            codes = [labels.get_loc(value) for value in values if value in labels]
+            filters.append((column, np.array(codes, dtype=np.int64)))  # Typed, so labels that are absent give no rows
+        return filters
+
+    def total(self, selections, measure='number_of_casualties'):
+        """
+        Sums a measure over the rows matching all selections.
+
+        Selections on the dimensions of the prefix sums (TOTAL_DIMENSIONS) are answered with a lookup per
+        selected label, and a range of consecutive labels of the last one, e.g. a month range, with one
+        subtraction. Selections on other dimensions, such as the tree map conditions, are summed from the cells
+        of the cube rolled up onto the selected dimensions.
+
+        Parameters:
+        - selections: Dictionary, or list of pairs, of column name to a value or a list of values, in the
+          same form as BitmapIndex.query().
+        - measure: 'count' or 'number_of_casualties'.
+
+        Returns:
+        - The sum as an integer.
+        """
+        filters = self._filters(selections)
+        columns = [column for column, _ in filters]
+        if set(columns) <= set(TOTAL_DIMENSIONS) and len(set(columns)) == len(columns):
+            prefix = self.prefix[measure]
+            selected = dict(filters)
+            *leading, last = TOTAL_DIMENSIONS
+            index = [selected.get(column, [prefix.shape[i] - 1]) for i, column in enumerate(leading)]
+            sums = prefix[np.ix_(*index)].reshape(-1, prefix.shape[-1]).sum(axis=0)
+            if last not in selected:
+                return int(round(sums[-1]))
+            # Each run of consecutive labels is the difference of two prefix sums
+            codes = np.unique(selected[last])
+            starts = codes[np.r_[True, np.diff(codes) > 1]] if len(codes) else codes
+            stops = codes[np.r_[np.diff(codes) > 1, True]] + 1 if len(codes) else codes
+            return int(round((sums[stops] - sums[starts]).sum()))
+
+        cells = self._rollup(columns)
+        keep = np.ones(len(cells[measure]), dtype=bool)
+        for column, codes in filters:
+            keep &= np.isin(cells[column], codes)
+        return int(round(cells[measure][keep].sum()))
+
+    def aggregate(self, selections):
+        """
+        Aggregates the rows matching all selections per local authority, as the 'Aggregated' map shows them.
+
+        Parameters:
+        - selections: Dictionary, or list of pairs, of column name to a value or a list of values, in the
+          same form as BitmapIndex.query(). Empty selections (None, '' or []) are ignored.
+
+        Returns:
+        - DataFrame with one row per local authority holding matching rows, with the mean latitude and
+          longitude, the casualty sum and the most common accident severity (ties go to the first severity).
+        """
+        # Translate the selected labels into codes
+        filters = self._filters(selections)
+        cells = self._rollup(column for column, _ in filters)
+        keep = cells[self.by] >= 0  # Rows without a local authority are dropped, like groupby does
+        for column, codes in filters:
+            keep &= np.isin(cells[column], codes)
+
+        groups = cells[self.by][keep]
+        size = len(self.labels[self.by])
+
+        def total(name):
+            return np.bincount(groups, weights=cells[name][keep], minlength=size)
+
+        count = total('count')
+        present = np.flatnonzero(count)
+        severity = groupwise_mode(sum_counts(groups, cells['severity'][keep], size)[present])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            latitude = total('latitude') / total('latitude_count')
+            longitude = total('longitude') / total('longitude_count')
+
+        return pd.DataFrame({
+            self.by: pd.Categorical.from_codes(present, categories=self.labels[self.by]),
+            'latitude': latitude[present],
+            'longitude': longitude[present],
+            'number_of_casualties': total('number_of_casualties')[present].round().astype(np.int64),
+            'accident_severity': pd.Categorical.from_codes(severity, categories=self.severities),
+        })
+
+    def counts(self, dimensions):
+        """
+        Counts the rows of every combination of labels of the given dimensions, from the cells of the cube.
+
+        Parameters:
+        - dimensions: The columns to group by, in order, a subset of the dimensions of the cube.
+
+        Returns:
+        - DataFrame with the labels (as Categoricals) of every combination that has rows, in the order of the
+          labels, and their row count. Combinations with a missing label are dropped, like groupby does.
+        """
+        codes = {column: self.cells[column] for column in dimensions}
+        cells = self._group(codes, {'count': self.cells['count']})[0]
+        keep = cells['count'] > 0
+        for column in dimensions:
+            keep &= cells[column] >= 0
+
+        result = pd.DataFrame({column: pd.Categorical.from_codes(cells[column][keep], categories=self.labels[column])
+                               for column in dimensions})
+        result['count'] = cells['count'][keep].round().astype(np.int64)
+        return result
+
+    def memory_usage(self):
+        """
+        Returns the memory held by the base cube and its rollups in bytes.
+        """
+        return (sum(values.nbytes for cells in [self.cells, *self._rollups.values()] for values in cells.values()) +
+                sum(values.nbytes for values in self.prefix.values()))
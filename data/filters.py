@@ -0,0 +1,62 @@
+import numpy as np
+
+from data.schema import MONTHS
+
+
+def normalize_selection(selections):
+    """
+    Brings filter selections into one form. Empty selections (None, '' or []) are dropped and single values
+    become lists.
+
+    Parameters:
+    - selections: Dictionary, or list of pairs, of column name to a value or a list of values.
+
+    Returns:
+    - List of (column name, list of values) pairs.
+    """
+    if isinstance(selections, dict):
+        selections = selections.items()
+
+    normalized = []
+    for column, values in selections:
+        if values is None or isinstance(values, str) and not values:
+            continue
+        if not isinstance(values, (list, tuple, set, np.ndarray)):
+            values = [values]
+        elif len(values) == 0:
+            continue
+        normalized.append((column, list(values)))
+    return normalized
+
+
+def month_labels(month_range):
+    """
+    Translates the range slider selection into the month labels it covers.
+
+    Parameters:
+    - month_range: The [first, last] month numbers of the range slider, or None.
+
+    Returns:
+    - List of month names, or None when the whole year is selected.
+    """
+    if not month_range or list(month_range) == [1, len(MONTHS)]:
+        return None
+    return MONTHS[month_range[0] - 1:month_range[1]]
+
+
+def select(data, mask, columns):
+    """
+    Materializes the selected rows of only the columns a chart needs.
+
+    Parameters:
+    - data: The shared (read-only) DataFrame.
+    - mask: Boolean row mask, or None to keep every row.
+    - columns: The columns to keep.
+
+    Returns:
+    - A new DataFrame holding the selected rows and columns.
+    """
+    columns = list(dict.fromkeys(columns))  # Drop duplicates, e.g. when both heatmap axes are the same
+    if mask is None:
+        return data[columns]
+    return data.loc[mask, columns]
@@ -0,0 +1,189 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from data.aggregate import category_counts, sum_counts
+from data.schema import codes_of
+
+
+# Levels of the pyramid. A cell of level L is a Web Mercator tile of zoom L, so level 16 cells are ~600 m wide
+MIN_LEVEL = 5
+MAX_LEVEL = 16
+# Levels between the map zoom and the grid shown at it, 5 levels give cells of about 8 pixels
+CELL_LEVELS = 5
+# Latitude limit of the Web Mercator projection
+MAX_LATITUDE = 85.0511287798
+# Number of (selection, level) groupings of filtered rows kept, least recently used first out
+MAX_SELECTIONS = 64
+
+
+def tile_x(longitude, level):
+    """
+    Returns the column of the cells of a level holding the longitudes, as floats.
+    """
+    return (np.asarray(longitude, dtype=float) + 180) / 360 * 2.0 ** level
+
+
+def tile_y(latitude, level):
+    """
+    Returns the row of the cells of a level holding the latitudes, as floats. Rows count from the north.
+    """
+    latitude = np.radians(np.clip(np.asarray(latitude, dtype=float), -MAX_LATITUDE, MAX_LATITUDE))
+    return (1 - np.arcsinh(np.tan(latitude)) / math.pi) / 2 * 2.0 ** level
+
+
+def cell_bounds(x, y, level):
+    """
+    Returns the west, south, east and north edges in degrees of the cells (x, y) of a level.
+    """
+    size = 2.0 ** level
+
+    def latitude(row):
+        return np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * row / size))))
+
+    return x / size * 360 - 180, latitude(y + 1), (x + 1) / size * 360 - 180, latitude(y)
+
+
+class GridPyramid:
+    """
+    Collision counts on a multi-resolution square grid for the 'Density' map display option, built once at startup.
+
+    Every level is the grid of Web Mercator tiles of that zoom, so cells are square on the map and each cell
+    splits into four cells of the next level. The pyramid keeps the finest cell of every row, and per level
+    the cells of the whole dataset with their per-severity collision counts and casualty sums, each level
+    summed from the one below. Unfiltered views are answered from these tables. Filtered ones count the selected
+    rows at the level of the view once per selection, and panning then only crops the cells kept for it.
+    """
+
+    def __init__(self, data, levels=range(MIN_LEVEL, MAX_LEVEL + 1)):
+        """
+        Builds the pyramid.
+
+        Parameters:
+        - data: DataFrame with latitude, longitude, accident_severity and number_of_casualties columns.
+        - levels: The levels to keep.
+        """
+        self.levels = list(levels)
+        self.finest = max(self.levels)
+
+        latitude = data['latitude'].to_numpy(dtype=float)
+        longitude = data['longitude'].to_numpy(dtype=float)
+        self.located = np.isfinite(latitude) & np.isfinite(longitude)
+        size = 2 ** self.finest
+        self.x = np.clip(np.nan_to_num(tile_x(longitude, self.finest)), 0, size - 1).astype(np.int32)
+        self.y = np.clip(np.nan_to_num(tile_y(latitude, self.finest)), 0, size - 1).astype(np.int32)
+
+        self.severity, self.severities = codes_of(data['accident_severity'])
+        self.casualties = np.nan_to_num(data['number_of_casualties'].to_numpy(dtype=float))
+
+        # Count the finest level from the rows, and every coarser level from the level below
+        rows = np.flatnonzero(self.located)
+        cells = self._group(self.x[rows], self.y[rows], self.severity[rows], self.casualties[rows])
+        self.pyramid = {self.finest: cells}
+        for level in range(self.finest - 1, min(self.levels) - 1, -1):
+            cells = self._group(cells['x'] >> 1, cells['y'] >> 1, cells['severity'], cells['number_of_casualties'])
+            self.pyramid[level] = cells
+        self.pyramid = {level: self.pyramid[level] for level in self.levels}
+        self._selections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _group(self, x, y, severity, casualties):
+        """
+        Sums the rows, or the cells of a finer level, per cell.
+
+        Parameters:
+        - x, y: The cell of every entry.
+        - severity: Severity code per row, or a count matrix with one row per cell.
+        - casualties: Casualties of every entry.
+
+        Returns:
+        - Dictionary of x, y, the (cell x severity) count matrix and the casualty sum of every cell.
+        """
+        keys, first, inverse = np.unique(x.astype(np.int64) << 32 | y, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        if severity.ndim == 2:
+            counts = sum_counts(inverse, severity, len(keys))
+        else:
+            counts = category_counts(inverse, severity, len(keys), len(self.severities))
+        return {'x': x[first], 'y': y[first], 'severity': counts.astype(np.int32),
+                'number_of_casualties': np.bincount(inverse, weights=casualties, minlength=len(keys))}
+
+    def level(self, zoom):
+        """
+        Returns the level of the grid shown at a map zoom.
+        """
+        return int(np.clip(round(zoom) + CELL_LEVELS, min(self.levels), max(self.levels)))
+
+    def _selected(self, mask, level, selection):
+        """
+        Returns the cells of a level holding selected rows, grouped once per selection and level.
+        """
+        key = None if selection is None else (selection, level)
+        if key is not None:
+            with self._lock:
+                cells = self._selections.get(key)
+                if cells is not None:
+                    self._selections.move_to_end(key)
+                    return cells
+
+        rows = np.flatnonzero(mask & self.located)
+        shift = self.finest - level
+        cells = self._group(self.x[rows] >> shift, self.y[rows] >> shift, self.severity[rows], self.casualties[rows])
+        if key is not None:
+            with self._lock:
+                self._selections[key] = cells
+                while len(self._selections) > MAX_SELECTIONS:
+                    self._selections.popitem(last=False)
+        return cells
+
+    def cells(self, mask=None, bounds=None, level=MIN_LEVEL, selection=None):
+        """
+        Counts the selected collisions per cell of a level.
+
+        Parameters:
+        - mask: Boolean row mask of the selected collisions, or None for all of them.
+        - bounds: [west, south, east, north] of the visible area, or None for the whole map. Only the cells
+          overlapping it are returned.
+        - level: The level of the grid, see level().
+        - selection: Hashable key of the selections the mask was built from, e.g. built with cache_key() of
+          data/cache.py. The cells of the selection are then grouped once per level and panning only crops them.
+          None groups the selected rows on every call.
+
+        Returns:
+        - DataFrame with one row per cell holding selected collisions: its edges (west, south, east, north),
+          its center (latitude, longitude), the number of collisions per accident severity, the collision
+          count and the casualty sum.
+        """
+        if mask is None or mask.all():
+            cells = self.pyramid[level]
+        else:
+            cells = self._selected(mask, level, selection)
+
+        x, y = cells['x'], cells['y']
+        keep = np.ones(len(x), dtype=bool)
+        if bounds is not None:
+            west, south, east, north = bounds
+            keep = ((x >= np.floor(tile_x(west, level))) & (x <= np.floor(tile_x(east, level))) &
+                    (y >= np.floor(tile_y(north, level))) & (y <= np.floor(tile_y(south, level))))
+        x, y, counts = x[keep], y[keep], cells['severity'][keep]
+
+        west, south, east, north = cell_bounds(x, y, level)
+        result = pd.DataFrame({'west': west, 'south': south, 'east': east, 'north': north,
+                               'latitude': (south + north) / 2, 'longitude': (west + east) / 2})
+        for code, severity in enumerate(self.severities):
+            result[severity] = counts[:, code]
+        result['count'] = counts.sum(axis=1)
+        result['number_of_casualties'] = cells['number_of_casualties'][keep].round().astype(np.int64)
+        return result
+
+    def memory_usage(self):
+        """
+        Returns the memory held by the pyramid and the groupings kept for selections in bytes.
+        """
+        with self._lock:
+            selected = list(self._selections.values())
+        return self.x.nbytes + self.y.nbytes + sum(values.nbytes for cells in list(self.pyramid.values()) + selected
+                                                   for values in cells.values())
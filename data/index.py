@@ -0,0 +1,201 @@
+import numpy as np
+
+from data.filters import normalize_selection
+from data.schema import codes_of
+
+
+# Filter dimensions of the map and bar chart tabs
+FILTER_COLUMNS = ['local_authority_ons_district', 'accident_severity', 'month', 'weather_conditions',
+                  'road_surface_conditions', 'light_conditions', 'urban_or_rural_area', 'road_type', 'speed_limit']
+
+
+class BitmapIndex:
+    """
+    An index over the filter columns of the dataset, built once at startup.
+
+    For every (column, value) pair it stores the rows holding that value, either as a packed bitmap
+    (one bit per row) or, for rare values such as a single local authority, as a sorted array of row ids,
+    whichever takes less memory. A combination of filters is answered by OR-ing the entries of the
+    selected values within a column and AND-ing the columns, without scanning the frame.
+
+    Columns whose rows are sorted by label, such as the month of the collisions (see sort_by_date in
+    data/loader.py), also keep the first row of every label, so a range of consecutive labels, e.g. a month
+    range, is answered as one slice of rows without touching the entries of the labels in between.
+    """
+
+    def __init__(self, data, columns=FILTER_COLUMNS):
+        """
+        Builds the index.
+
+        Parameters:
+        - data: The DataFrame to index. The index refers to its rows by position.
+        - columns: The columns to index.
+        """
+        self.rows = len(data)
+        self.nbytes = (self.rows + 7) // 8
+        self.codes = {}
+        self.postings = {}
+        self.offsets = {}
+        for column in columns:
+            codes, labels = codes_of(data[column])
+
+            # Sort the row ids by code once, the rows of each value are then one contiguous, sorted run
+            order = np.argsort(codes, kind='stable').astype(np.int32)
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(codes + 1, minlength=len(labels) + 1))])
+
+            self.codes[column] = {label: code for code, label in enumerate(labels)}
+            self.postings[column] = [self._posting(order[offsets[code + 1]:offsets[code + 2]])
+                                     for code in range(len(labels))]
+            # Missing values sort after every label
+            if (np.diff(np.where(codes < 0, len(labels), codes)) >= 0).all():
+                self.offsets[column] = offsets[1:] - offsets[1]
+
+    def _posting(self, ids):
+        """
+        Stores the rows of one value as row ids or as a packed bitmap, whichever is smaller.
+        """
+        if ids.nbytes < self.nbytes:
+            return ids
+        return self._to_bits(ids)
+
+    def _to_bits(self, ids):
+        """
+        Converts sorted row ids to a packed bitmap.
+        """
+        bits = np.zeros(self.rows, dtype=bool)
+        bits[ids] = True
+        return np.packbits(bits)
+
+    @staticmethod
+    def _test(bits, ids):
+        """
+        Tests the bits of the given row ids in a packed bitmap.
+        """
+        return (bits[ids >> 3] >> (7 - (ids & 7)) & 1).astype(bool)
+
+    def _clip(self, rows, start, stop):
+        """
+        Keeps the rows of a result, row ids or a packed bitmap, between start (included) and stop (excluded).
+        """
+        if rows.dtype == np.int32:
+            return rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)]
+        bits = np.zeros_like(rows)
+        bits[start >> 3:(stop + 7) >> 3] = rows[start >> 3:(stop + 7) >> 3]
+        if start & 7:
+            bits[start >> 3] &= 0xFF >> (start & 7)
+        if stop & 7:
+            bits[stop >> 3] &= (0xFF << (8 - (stop & 7))) & 0xFF
+        return bits
+
+    def _range(self, column, values):
+        """
+        Returns the (start, stop) rows of values of a sorted column, or None when they are not consecutive labels.
+        """
+        if column not in self.offsets:
+            return None
+        lookup = self.codes[column]
+        codes = sorted({lookup[value] for value in values if value in lookup})
+        if not codes or codes[-1] - codes[0] != len(codes) - 1:
+            return None
+        offsets = self.offsets[column]
+        return int(offsets[codes[0]]), int(offsets[codes[-1] + 1])
+
+    def _select(self, column, values):
+        """
+        Returns the rows holding any of the values of one column, as row ids or a packed bitmap.
+        """
+        lookup = self.codes[column]
+        postings = [self.postings[column][lookup[value]] for value in values if value in lookup]
+        if not postings:
+            return np.empty(0, dtype=np.int32)
+        if len(postings) == 1:
+            return postings[0]
+        sparse = [posting for posting in postings if posting.dtype == np.int32]
+        dense = [posting for posting in postings if posting.dtype != np.int32]
+        if not dense:
+            # Values of one column never share rows, so a sort is enough to merge them
+            return np.sort(np.concatenate(sparse))
+        bits = np.bitwise_or.reduce(dense)
+        for ids in sparse:
+            bits = bits | self._to_bits(ids)
+        return bits
+
+    def _query(self, selections):
+        """
+        Finds the rows matching all selections, keeping the selections of consecutive labels of sorted columns
+        as one range of rows.
+
+        Returns:
+        - The rows matching the other selections as row ids or a packed bitmap, or None when there are none.
+        - The (start, stop) range of rows the rows are within, or None when there is no such range.
+        """
+        result = None
+        bounds = None
+        for column, values in normalize_selection(selections):
+            span = self._range(column, values)
+            if span is not None:
+                bounds = span if bounds is None else (max(bounds[0], span[0]), min(bounds[1], span[1]))
+                continue
+            rows = self._select(column, values)
+            if result is None:
+                result = rows
+            elif result.dtype == np.int32 and rows.dtype == np.int32:
+                result = np.intersect1d(result, rows, assume_unique=True)
+            elif result.dtype == np.int32:
+                result = result[self._test(rows, result)]
+            elif rows.dtype == np.int32:
+                result = rows[self._test(result, rows)]
+            else:
+                result = result & rows
+        if bounds is not None:
+            bounds = (bounds[0], max(bounds))
+            if result is not None:
+                result = self._clip(result, *bounds)
+        return result, bounds
+
+    def query(self, selections):
+        """
+        Finds the rows matching all selections.
+
+        Parameters:
+        - selections: Dictionary, or list of pairs, of column name to a value or a list of values.
+          Empty selections (None, '' or []) are ignored, values that do not occur give no rows.
+
+        Returns:
+        - The matching rows as a sorted int32 array of row ids, a packed uint8 bitmap, or None when
+          nothing was selected.
+        """
+        result, bounds = self._query(selections)
+        if result is None and bounds is not None:
+            return self._posting(np.arange(*bounds, dtype=np.int32))
+        return result
+
+    def mask(self, selections):
+        """
+        Finds the rows matching all selections.
+
+        Parameters:
+        - selections: Dictionary, or list of pairs, of column name to a value or a list of values, see query().
+
+        Returns:
+        - A boolean numpy array with one entry per indexed row.
+        """
+        rows, bounds = self._query(selections)
+        if rows is None:
+            if bounds is None:
+                return np.ones(self.rows, dtype=bool)
+            mask = np.zeros(self.rows, dtype=bool)
+            mask[bounds[0]:bounds[1]] = True
+            return mask
+        if rows.dtype == np.int32:
+            mask = np.zeros(self.rows, dtype=bool)
+            mask[rows] = True
+            return mask
+        return np.unpackbits(rows, count=self.rows).view(bool)
+
+    def memory_usage(self):
+        """
+        Returns the memory held by the index in bytes.
+        """
+        return (sum(posting.nbytes for postings in self.postings.values() for posting in postings) +
+                sum(offsets.nbytes for offsets in self.offsets.values()))
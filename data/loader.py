@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data.schema import MONTHS, apply_schema, codes_of
+from data.tables import TABLES, CollisionTables, split_tables
+
+
+# Default locations of the merged dataset and of its columnar build
+CSV_PATH = 'merged_collision_data.csv'
+COLUMNAR_PATH = 'merged_collision_data'
+META_FILE = 'meta.json'
+
+
+def read_csv_dataset(csv_path=CSV_PATH):
+    """
+    Reads the merged collision CSV produced by data_cleaning_and_merging.ipynb.
+
+    Parameters:
+    - csv_path: Path to the merged collision CSV file.
+
+    Returns:
+    - A pandas DataFrame with the raw merged data.
+    """
+    return pd.read_csv(csv_path, low_memory=False, on_bad_lines='skip')
+
+
+def read_csv_tables(csv_path=CSV_PATH):
+    """
+    Reads the merged collision CSV and splits it into the collision, vehicle and casualty tables.
+
+    Parameters:
+    - csv_path: Path to the merged collision CSV file.
+
+    Returns:
+    - A CollisionTables, with the label columns converted following data/schema.py.
+    """
+    return split_tables(apply_schema(read_csv_dataset(csv_path)))
+
+
+def has_columnar(columnar_path=COLUMNAR_PATH):
+    """
+    Checks whether a columnar build of the dataset exists.
+
+    Parameters:
+    - columnar_path: Directory written by data/build.py.
+
+    Returns:
+    - True if the directory holds a complete columnar build.
+    """
+    return os.path.isfile(os.path.join(columnar_path, META_FILE))
+
+
+def read_columnar_dataset(columnar_path):
+    """
+    Reads a table of the columnar build written by data/build.py.
+
+    Every column file is memory-mapped read-only instead of being read into memory. Category
+    columns become pandas Categoricals directly on top of the mapped codes, so the frame holds
+    no per-row strings and all Dash worker processes on a host share the same pages through
+    the OS page cache.
+
+    Parameters:
+    - columnar_path: Directory of one table, written by write_columnar() in data/build.py.
+
+    Returns:
+    - A pandas DataFrame backed by read-only memory maps.
+    """
+    with open(os.path.join(columnar_path, META_FILE)) as f:
+        meta = json.load(f)
+
+    columns = {}
+    for column in meta['columns']:
+        values = np.load(os.path.join(columnar_path, column['file']), mmap_mode='r')
+        if column['kind'] == 'category':
+            # Codes were written by pd.Categorical, so they are valid and can be used as they are
+            values = pd.Categorical.from_codes(values, categories=column['categories'], validate=False)
+        columns[column['name']] = values
+    # copy=False keeps every column on its own memory map instead of consolidating them into new blocks
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_columnar_tables(columnar_path=COLUMNAR_PATH):
+    """
+    Reads the collision, vehicle and casualty tables of a columnar build written by data/build.py.
+
+    Parameters:
+    - columnar_path: Directory written by data/build.py.
+
+    Returns:
+    - A CollisionTables backed by read-only memory maps, with the label columns following data/schema.py.
+    """
+    with open(os.path.join(columnar_path, META_FILE)) as f:
+        meta = json.load(f)
+    if 'tables' not in meta:
+        # Builds written before the split hold the merged rows, they are split in memory
+        return split_tables(apply_schema(read_columnar_dataset(columnar_path)))
+    return CollisionTables(*[apply_schema(read_columnar_dataset(os.path.join(columnar_path, name)))
+                             for name in TABLES])
+
+
+def file_hash(path):
+    """
+    Computes the content hash of a file, reading it in chunks.
+
+    Parameters:
+    - path: Path to the file.
+
+    Returns:
+    - The hex digest of the file content.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dataset_hash(csv_path=CSV_PATH, columnar_path=COLUMNAR_PATH):
+    """
+    Identifies the content of the dataset load_tables() returns, e.g. to invalidate cached figures.
+
+    The columnar build records the hash of the CSV it was converted from, so both load paths give the
+    same hash for the same data and nothing has to be re-read here when the build is used.
+
+    Parameters:
+    - csv_path: Path to the merged collision CSV file.
+    - columnar_path: Directory written by data/build.py.
+
+    Returns:
+    - The hex digest of the source CSV.
+    """
+    if has_columnar(columnar_path):
+        with open(os.path.join(columnar_path, META_FILE)) as f:
+            meta = json.load(f)
+        if 'source_hash' in meta:
+            return meta['source_hash']
+        # Builds written before the hash was recorded are identified by their own files
+        digest = hashlib.blake2b(digest_size=16)
+        for name in sorted(os.listdir(columnar_path)):
+            if os.path.isfile(os.path.join(columnar_path, name)):
+                digest.update(file_hash(os.path.join(columnar_path, name)).encode())
+        return digest.hexdigest()
+    return file_hash(csv_path)
+
+
+def load_tables(csv_path=CSV_PATH, columnar_path=COLUMNAR_PATH):
+    """
+    Loads the collision, vehicle and casualty tables, preferring the columnar build when it is present
+    and falling back to parsing and splitting the CSV otherwise. Either way the label columns are
+    converted to Categoricals following data/schema.py, the collisions are sorted by month and the month, day
+    of the year and hour of every collision are derived from its date and time.
+
+    Parameters:
+    - csv_path: Path to the merged collision CSV file.
+    - columnar_path: Directory written by data/build.py.
+
+    Returns:
+    - A CollisionTables (see data/tables.py).
+    """
+    if has_columnar(columnar_path):
+        tables = read_columnar_tables(columnar_path)
+    else:
+        tables = read_csv_tables(csv_path)
+    add_date_columns(tables.collisions)
+    # Builds written by data/build.py are already sorted, older ones are sorted in memory
+    tables = sort_by_date(tables)
+    return tables
+
+
+def sort_by_date(tables):
+    """
+    Puts the collisions in order of the month of their date, then of the date, so that the collisions of a month,
+    or of a range of months, are one contiguous run of rows whatever the years the data spans. Collisions without
+    a date come last, collisions of the same day keep the order they had.
+
+    Parameters:
+    - tables: A CollisionTables.
+
+    Returns:
+    - The sorted tables, the same object when they already are.
+    """
+    date = pd.DatetimeIndex(pd.to_datetime(tables.collisions['date'], dayfirst=True))
+    month = np.nan_to_num(date.month.to_numpy(dtype=float), nan=13).astype(np.int8)
+    day = date.asi8  # NaT is the smallest integer, but only occurs with the month 13
+    same_month = month[1:] == month[:-1]
+    if ((month[1:] > month[:-1]) | (same_month & (day[1:] >= day[:-1]))).all():
+        return tables
+    return tables.sort_collisions(np.lexsort((day, month)))
+
+
+def add_date_columns(data):
+    """
+    Converts the dates to a datetime64 column, whichever way they were loaded, and derives the month, as a
+    Categorical in calendar order whose codes are the month numbers minus one, the day of the year and the hour of
+    the day. They are computed from the integer fields of the dates and from the distinct times, without
+    formatting or parsing a string per row.
+
+    Parameters:
+    - data: The collision DataFrame, modified in place.
+
+    Returns:
+    - The same DataFrame.
+    """
+    # pandas parses the dates of a Categorical (the columnar build) once per category but keeps them a Categorical
+    data['date'] = pd.to_datetime(data['date'], dayfirst=True).astype('datetime64[ns]')
+    month = data['date'].dt.month.to_numpy(dtype=float)
+    day = data['date'].dt.dayofyear.to_numpy(dtype=float)
+    data['month'] = pd.Categorical.from_codes(np.nan_to_num(month, nan=0).astype(np.int8) - 1, categories=MONTHS)
+    data['day_of_year'] = np.nan_to_num(day, nan=0).astype(np.int16)  # 0 when the date is missing
+    data['hour'] = hour_of_day(data['time'])
+    return data
+
+
+def hour_of_day(time):
+    """
+    Reads the hour of 'HH:MM' times. A day has at most 1440 distinct times, so the times are categorized and
+    only the categories are parsed.
+
+    Parameters:
+    - time: Series of 'HH:MM' strings, or a Categorical of them.
+
+    Returns:
+    - int8 array of the hours, -1 where the time is missing or not a time.
+    """
+    codes, times = codes_of(time)
+    hours = pd.to_datetime(times.astype(str), format='%H:%M', errors='coerce').hour
+    hours = np.append(np.nan_to_num(np.asarray(hours, dtype=float), nan=-1), -1).astype(np.int8)
+    return hours[codes]  # The code -1 of missing times picks the -1 appended last
@@ -0,0 +1,207 @@
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from data.loader import COLUMNAR_PATH
+from data.schema import LABEL_NAMES, codes_of
+
+
+# Attributes of the heatmap, see heatmap_masking() in main.py
+HEATMAP_COLUMNS = ['first_point_of_impact', 'pedestrian_movement', 'junction_location', 'junction_control',
+                   'casualty_class', 'vehicle_manoeuvre']
+# Columns the counts can be sliced by, outermost first
+SLICE_COLUMNS = ['local_authority_ons_district', 'accident_severity']
+# File of the counts in the columnar build
+PAIRS_FILE = 'pairs.npz'
+
+
+class PairCounts:
+    """
+    Row counts of every pair of labels of every pair of heatmap attributes, per local authority and severity.
+
+    The counts of a pair of attributes are stored sparsely, as the sorted keys of the observed combinations of
+    (local authority, severity, y label, x label) codes with their count. Missing values get the slot after the
+    labels of their column. Since the local authority and the severity are the leading digits of the key, the
+    combinations of one local authority, or of one local authority and severity, are a contiguous run of keys.
+    A heatmap is then a bincount of the counts of a run onto the (y, x) digits, without touching the rows.
+    """
+
+    def __init__(self, labels, keys, counts):
+        """
+        Initializes the counts.
+
+        Parameters:
+        - labels: Dictionary of column name to the pandas Index of its labels, for the heatmap and slice columns.
+        - keys: Dictionary of (x column, y column) to the sorted key array of the pair, see count_pairs().
+        - counts: Dictionary of (x column, y column) to the row count of every key.
+        """
+        self.labels = labels
+        self.keys = keys
+        self.counts = counts
+
+    def relabel(self, column, mapping):
+        """
+        Replaces labels of a slice column, e.g. the names of LABEL_NAMES in data/schema.py for counts written
+        before they were applied. Labels that become equal are selected together.
+        """
+        self.labels[column] = pd.Index([mapping.get(label, label) for label in self.labels[column]])
+
+    def _sizes(self, x, y):
+        """
+        Returns the number of slots (labels and the missing slot) of every digit of the keys of a pair.
+        """
+        return [len(self.labels[column]) + 1 for column in SLICE_COLUMNS + [y, x]]
+
+    def _runs(self, x, y, selections):
+        """
+        Returns the keys and counts of a pair matching the selected labels of the slice columns.
+        """
+        keys, counts = self.keys[(x, y)], self.counts[(x, y)]
+        sizes = self._sizes(x, y)
+        strides = np.cumprod(sizes[::-1])[::-1]  # strides[i] is the key span of one code of digit i - 1
+        runs = [(0, len(keys))]
+        prefixes = [0]
+        for digit, column in enumerate(SLICE_COLUMNS):
+            value = selections.get(column)
+            if value is None:
+                break
+            codes = np.flatnonzero(self.labels[column] == value)
+            # Every selected code narrows each run to the keys starting with it
+            prefixes = [prefix * sizes[digit] + code for prefix in prefixes for code in codes]
+            span = strides[digit + 1]
+            runs = [(np.searchsorted(keys, prefix * span), np.searchsorted(keys, (prefix + 1) * span))
+                    for prefix in prefixes]
+        else:
+            digit = len(SLICE_COLUMNS)
+
+        keys = np.concatenate([keys[start:stop] for start, stop in runs] or [keys[:0]])
+        counts = np.concatenate([counts[start:stop] for start, stop in runs] or [counts[:0]])
+        # A slice column after the first one without a selection still filters, by its digit of the keys
+        for later in range(digit + 1, len(SLICE_COLUMNS)):
+            value = selections.get(SLICE_COLUMNS[later])
+            if value is not None:
+                keep = np.isin(keys // strides[later + 1] % sizes[later],
+                               np.flatnonzero(self.labels[SLICE_COLUMNS[later]] == value))
+                keys, counts = keys[keep], counts[keep]
+        return keys, counts
+
+    def matrix(self, x, y, local_authority=None, severity=None, drop=()):
+        """
+        Looks up the counts of every pair of labels of two attributes, as the heatmap draws them.
+
+        Parameters:
+        - x, y: The columns of the x and y axis, any two of HEATMAP_COLUMNS (or the same one twice).
+        - local_authority: The local authority to count, or None for all of them.
+        - severity: The accident severity to count, or None for all of them.
+        - drop: Labels whose rows and columns are left out, e.g. those that stand for a missing value.
+
+        Returns:
+        - A numpy array of shape (number of y labels, number of x labels).
+        - The x labels and the y labels, those that occur in a selected row, in category order. Like
+          contingency() in data/aggregate.py, a label that only occurs next to a missing value gets zeros.
+        """
+        transpose = (x, y) not in self.keys
+        if transpose:
+            x, y = y, x
+        keys, counts = self._runs(x, y, {'local_authority_ons_district': local_authority,
+                                         'accident_severity': severity})
+        ny, nx = len(self.labels[y]) + 1, len(self.labels[x]) + 1
+        matrix = np.bincount(keys % (ny * nx), weights=counts, minlength=ny * nx).reshape(ny, nx).astype(np.int64)
+        x_labels, y_labels = self.labels[x], self.labels[y]
+        if transpose:
+            matrix, x_labels, y_labels = matrix.T, y_labels, x_labels
+
+        # Leave out the dropped labels but keep the missing slot, which is last
+        keep_x = np.append(~x_labels.isin(list(drop)), True)
+        keep_y = np.append(~y_labels.isin(list(drop)), True)
+        matrix = matrix[np.ix_(keep_y, keep_x)]
+        x_labels, y_labels = x_labels[keep_x[:-1]], y_labels[keep_y[:-1]]
+
+        x_present = matrix[:, :-1].sum(axis=0) > 0
+        y_present = matrix[:-1, :].sum(axis=1) > 0
+        return matrix[:-1, :-1][np.ix_(y_present, x_present)], x_labels[x_present], y_labels[y_present]
+
+    def save(self, path):
+        """
+        Writes the counts to a compressed .npz file.
+        """
+        # Labels are stored as fixed width text, which loads without pickle
+        arrays = {f'labels/{column}': np.array([str(label) for label in labels], dtype=str)
+                  for column, labels in self.labels.items()}
+        for (x, y), keys in self.keys.items():
+            arrays[f'keys/{x}/{y}'] = keys
+            arrays[f'counts/{x}/{y}'] = self.counts[(x, y)]
+        np.savez_compressed(path, **arrays)
+
+    def memory_usage(self):
+        """
+        Returns the memory held by the keys and counts in bytes.
+        """
+        return sum(keys.nbytes + self.counts[pair].nbytes for pair, keys in self.keys.items())
+
+
+def count_pairs(tables, columns=HEATMAP_COLUMNS):
+    """
+    Counts every pair of labels of every unordered pair of columns (a column paired with itself included), per
+    local authority and severity.
+
+    Every pair is counted at the finest grain of its two columns (see CollisionTables.frame), like the heatmap.
+
+    Parameters:
+    - tables: A CollisionTables.
+    - columns: The columns to pair.
+
+    Returns:
+    - A PairCounts.
+    """
+    labels, keys, counts = {}, {}, {}
+    for x, y in itertools.combinations_with_replacement(columns, 2):
+        data = tables.frame(SLICE_COLUMNS + [y, x])
+        key = np.zeros(len(data), dtype=np.int64)
+        for column in SLICE_COLUMNS + [y, x]:
+            codes, labels[column] = codes_of(data[column])
+            codes = codes.astype(np.int64)
+            size = len(labels[column]) + 1
+            key = key * size + np.where(codes >= 0, codes, size - 1)  # Missing values take the last slot
+        keys[(x, y)], counts[(x, y)] = np.unique(key, return_counts=True)
+        counts[(x, y)] = counts[(x, y)].astype(np.int32)
+    return PairCounts(labels, keys, counts)
+
+
+def read_pair_counts(path):
+    """
+    Reads counts written by PairCounts.save().
+    """
+    with np.load(path) as arrays:
+        labels = {name.split('/')[1]: pd.Index(arrays[name]) for name in arrays.files if name.startswith('labels/')}
+        keys, counts = {}, {}
+        for name in arrays.files:
+            if name.startswith('keys/'):
+                _, x, y = name.split('/')
+                keys[(x, y)] = arrays[name]
+                counts[(x, y)] = arrays[f'counts/{x}/{y}']
+    pairs = PairCounts(labels, keys, counts)
+    for column, names in LABEL_NAMES.items():
+        if column in labels:
+            pairs.relabel(column, names)
+    return pairs
+
+
+def load_pair_counts(tables, columnar_path=COLUMNAR_PATH):
+    """
+    Loads the pair counts written with the columnar build, or counts them from the tables when the build does not
+    have them (e.g. when the app runs from the CSV).
+
+    Parameters:
+    - tables: The CollisionTables the counts must describe.
+    - columnar_path: Directory written by data/build.py.
+
+    Returns:
+    - A PairCounts.
+    """
+    path = os.path.join(columnar_path, PAIRS_FILE)
+    if os.path.isfile(path):
+        return read_pair_counts(path)
+    return count_pairs(tables)
@@ -0,0 +1,362 @@
+import calendar
+
+import pandas as pd
+
+
+SEVERITIES = ['Fatal', 'Serious', 'Slight']
+DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+MONTHS = list(calendar.month_name[1:])
+SPEED_LIMITS = ['20', '30', '40', '50', '60', '70', 'unknown (self reported)', 'Data missing or out of range']
+
+# Fixed category order of every low-cardinality label column decoded by data_cleaning_and_merging.ipynb.
+# Labels follow the order of the original DfT codes, with the missing-value code (-1) last.
+LABEL_ORDERS = {
+    'accident_severity': SEVERITIES,
+    'day_of_week': DAYS,
+    'month': MONTHS,
+    'speed_limit': SPEED_LIMITS,
+    'first_road_class': [
+        'Motorway', 'A(M)', 'A', 'B', 'C', 'Unclassified'
+    ],
+    'road_type': [
+        'Roundabout', 'One way street', 'Dual carriageway', 'Single carriageway', 'Slip road', 'Unknown',
+        'One way street/Slip road', 'Data missing or out of range'
+    ],
+    'junction_detail': [
+        'Not at junction or within 20 metres', 'Roundabout', 'Mini-roundabout', 'T or staggered junction',
+        'Slip road', 'Crossroads', 'More than 4 arms (not roundabout)', 'Private drive or entrance', 'Other junction',
+        'unknown (self reported)', 'Data missing or out of range'
+    ],
+    'junction_control': [
+        'Not at junction or within 20 metres', 'Authorised person', 'Auto traffic signal', 'Stop sign',
+        'Give way or uncontrolled', 'unknown (self reported)', 'Data missing or out of range'
+    ],
+    'second_road_class': [
+        'Not at junction or within 20 metres', 'Motorway', 'A(M)', 'A', 'B', 'C', 'Unclassified'
+    ],
+    'pedestrian_crossing_human_control': [
+        'None within 50 metres', 'Control by school crossing patrol', 'Control by other authorised person',
+        'Unknown (self reported)', 'Data missing or out of range'
+    ],
+    'pedestrian_crossing_physical_facilities': [
+        'No physical crossing facilities within 50 metres', 'Zebra',
+        'Pelican, puffin, toucan or similar non-junction pedestrian light crossing',
+        'Pedestrian phase at traffic signal junction', 'Footbridge or subway', 'Central refuge',
+        'Unknown (self reported)', 'Data missing or out of range'
+    ],
+    'light_conditions': [
+        'Daylight', 'Darkness - lights lit', 'Darkness - lights unlit', 'Darkness - no lighting',
+        'Darkness - lighting unknown', 'Data missing or out of range'
+    ],
+    'weather_conditions': [
+        'Fine no high winds', 'Raining no high winds', 'Snowing no high winds', 'Fine + high winds',
+        'Raining + high winds', 'Snowing + high winds', 'Fog or mist', 'Other', 'Unknown',
+        'Data missing or out of range'
+    ],
+    'road_surface_conditions': [
+        'Dry', 'Wet or damp', 'Snow', 'Frost or ice', 'Flood over 3cm deep', 'Oil or diesel', 'Mud',
+        'Unknown (self-reported)', 'Data missing or out of range'
+    ],
+    'special_conditions_at_site': [
+        'None', 'Auto traffic signal - out', 'Auto signal part defective',
+        'Road sign or marking defective or obscured', 'Roadworks', 'Road surface defective', 'Oil or diesel', 'Mud',
+        'Unknown (self-reported)', 'Data missing or out of range'
+    ],
+    'carriageway_hazards': [
+        'None', 'Vehicle load on road', 'Other object on road', 'Previous accident', 'Dog on road',
+        'Other animal on road', 'Pedestrian in carriageway - not injured',
+        'Any animal in carriageway (except ridden horse)', 'Unknown (self-reported)', 'Data missing or out of range'
+    ],
+    'urban_or_rural_area': [
+        'Urban', 'Rural', 'Unallocated', 'Data missing or out of range'
+    ],
+    'did_police_officer_attend_scene_of_accident': [
+        'Yes', 'No', 'No - accident was reported using a self completion form (self rep only)',
+        'Data missing or out of range'
+    ],
+    'trunk_road_flag': [
+        'Trunk (Roads managed by Highways England)', 'Non-trunk', 'Data missing or out of range'
+    ],
+    'vehicle_type': [
+        'Pedal cycle', 'Motorcycle 50cc and under', 'Motorcycle 125cc and under',
+        'Motorcycle over 125cc and up to 500cc', 'Motorcycle over 500cc', 'Taxi/Private hire car', 'Car',
+        'Minibus (8 - 16 passenger seats)', 'Bus or coach (17 or more pass seats)', 'Ridden horse',
+        'Agricultural vehicle', 'Tram', 'Van / Goods 3.5 tonnes mgw or under', 'Goods over 3.5t. and under 7.5t',
+        'Goods 7.5 tonnes mgw and over', 'Mobility scooter', 'Electric motorcycle', 'Other vehicle',
+        'Motorcycle - unknown cc', 'Goods vehicle - unknown weight', 'Unknown vehicle type (self rep only)',
+        'Motorcycle - Scooter (1979-1998)', 'Motorcycle (1979-1998)', 'Motorcycle - Combination (1979-1998)',
+        'Motorcycle over 125cc (1999-2004)', 'Taxi (excluding private hire cars) (1979-2004)',
+        'Car (including private hire cars) (1979-2004)', 'Minibus/Motor caravan (1979-1998)',
+        'Goods over 3.5 tonnes (1979-1998)', 'Data missing or out of range'
+    ],
+    'towing_and_articulation': [
+        'No tow/articulation', 'Articulated vehicle', 'Double or multiple trailer', 'Caravan', 'Single trailer',
+        'Other tow', 'Unknown (self reported)', 'Data missing or out of range'
+    ],
+    'vehicle_manoeuvre': [
+        'Reversing', 'Parked', 'Waiting to go - held up', 'Slowing or stopping', 'Moving off', 'U-turn',
+        'Turning left', 'Waiting to turn left', 'Turning right', 'Waiting to turn right', 'Changing lane to left',
+        'Changing lane to right', 'Overtaking moving vehicle - offside', 'Overtaking static vehicle - offside',
+        'Overtaking - nearside', 'Going ahead left-hand bend', 'Going ahead right-hand bend', 'Going ahead other',
+        'Unknown (self reported)', 'Data missing or out of range'
+    ],
+    'vehicle_direction_from': [
+        'Parked', 'North', 'North East', 'East', 'South East', 'South', 'South West', 'West', 'North West',
+        'Unknown (self reported)'
+    ],
+    'vehicle_direction_to': [
+        'Parked', 'North', 'North East', 'East', 'South East', 'South', 'South West', 'West', 'North West',
+        'Unknown (self reported)'
+    ],
+    'vehicle_location_restricted_lane': [
+        'On main carriageway - not in restricted lane', 'Tram/Light rail track', 'Bus lane',
+        'Busway (including guided busway)', 'Cycle lane (on main carriageway)',
+        'Cycleway or shared use footway (not part of main carriageway)', 'On lay-by or hard shoulder',
+        'Entering lay-by or hard shoulder', 'Leaving lay-by or hard shoulder', 'Footway (pavement)',
+        'Not on carriageway', 'Unknown (self reported)'
+    ],
+    'junction_location': [
+        'Not at or within 20 metres of junction', 'Approaching junction or waiting/parked at junction approach',
+        'Cleared junction or waiting/parked at junction exit', 'Leaving roundabout', 'Entering roundabout',
+        'Leaving main road', 'Entering main road', 'Entering from slip road',
+        'Mid Junction - on roundabout or on main road', 'Unknown (self reported)', 'Data missing or out of range'
+    ],
+    'skidding_and_overturning': [
+        'None', 'Skidded', 'Skidded and overturned', 'Jackknifed', 'Jackknifed and overturned', 'Overturned',
+        'Unknown (self reported)', 'Data missing or out of range'
+    ],
+    'hit_object_in_carriageway': [
+        'None', 'Previous accident', 'Road works', 'Parked vehicle', 'Bridge (roof)', 'Bridge (side)',
+        'Bollard or refuge', 'Open door of vehicle', 'Central island of roundabout', 'Kerb', 'Other object',
+        'Any animal (except ridden horse)', 'Unknown (self reported)', 'Data missing or out of range'
+    ],
+    'vehicle_leaving_carriageway': [
+        'Did not leave carriageway', 'Nearside', 'Nearside and rebounded', 'Straight ahead at junction',
+        'Offside on to central reservation', 'Offside on to central reservation + rebounded',
+        'Offside - crossed central reservation', 'Offside', 'Offside and rebounded', 'Unknown (self reported)',
+        'Data missing or out of range'
+    ],
+    'hit_object_off_carriageway': [
+        'None', 'Road sign or traffic signal', 'Lamp post', 'Telegraph or electricity pole', 'Tree',
+        'Bus stop or bus shelter', 'Central crash barrier', 'Near/Offside crash barrier', 'Submerged in water',
+        'Entered ditch', 'Other permanent object', 'Wall or fence', 'Unknown (self reported)',
+        'Data missing or out of range'
+    ],
+    'first_point_of_impact': [
+        'Did not impact', 'Front', 'Back', 'Offside', 'Nearside', 'Unknown (self reported)',
+        'Data missing or out of range'
+    ],
+    'vehicle_left_hand_drive': [
+        'No', 'Yes', 'Unknown', 'Data missing or out of range'
+    ],
+    'journey_purpose_of_driver': [
+        'Journey as part of work', 'Commuting to/from work', 'Taking pupil to/from school',
+        'Pupil riding to/from school', 'Other', 'Not known', 'Other/Not known', 'Data missing or out of range'
+    ],
+    'sex_of_driver': [
+        'Male', 'Female', 'Not known', 'Data missing or out of range'
+    ],
+    'age_band_of_driver': [
+        '0 - 5', '6 - 10', '11 - 15', '16 - 20', '21 - 25', '26 - 35', '36 - 45', '46 - 55', '56 - 65', '66 - 75',
+        'Over 75', 'Data missing or out of range'
+    ],
+    'propulsion_code': [
+        'Petrol', 'Heavy oil', 'Electric', 'Steam', 'Gas', 'Petrol/Gas (LPG)', 'Gas/Bi-fuel', 'Hybrid electric',
+        'Gas Diesel', 'New fuel technology', 'Fuel cells', 'Electric diesel', 'Undefined'
+    ],
+    'driver_imd_decile': [
+        'Most deprived 10%', 'More deprived 10-20%', 'More deprived 20-30%', 'More deprived 30-40%',
+        'More deprived 40-50%', 'Less deprived 40-50%', 'Less deprived 30-40%', 'Less deprived 20-30%',
+        'Less deprived 10-20%', 'Least deprived 10%', 'Data missing or out of range'
+    ],
+    'driver_home_area_type': [
+        'Urban area', 'Small town', 'Rural', 'Data missing or out of range'
+    ],
+    'casualty_class': [
+        'Driver or rider', 'Passenger', 'Pedestrian'
+    ],
+    'sex_of_casualty': [
+        'Male', 'Female', 'unknown (self reported)', 'Data missing or out of range'
+    ],
+    'age_band_of_casualty': [
+        '0 - 5', '6 - 10', '11 - 15', '16 - 20', '21 - 25', '26 - 35', '36 - 45', '46 - 55', '56 - 65', '66 - 75',
+        'Over 75', 'Data missing or out of range'
+    ],
+    'casualty_severity': [
+        'Fatal', 'Serious', 'Slight'
+    ],
+    'pedestrian_location': [
+        'Not a Pedestrian', 'Crossing on pedestrian crossing facility', 'Crossing in zig-zag approach lines',
+        'Crossing in zig-zag exit lines', 'Crossing elsewhere within 50m. of pedestrian crossing',
+        'In carriageway, crossing elsewhere', 'On footway or verge',
+        'On refuge, central island or central reservation',
+        'In centre of carriageway - not on refuge, island or central reservation', 'In carriageway, not crossing',
+        'Unknown or other', 'Data missing or out of range'
+    ],
+    'pedestrian_movement': [
+        'Not a Pedestrian', "Crossing from driver's nearside",
+        'Crossing from nearside - masked by parked or stationary vehicle', "Crossing from driver's offside",
+        'Crossing from offside - masked by parked or stationary vehicle',
+        'In carriageway, stationary - not crossing  (standing or playing)',
+        'In carriageway, stationary - not crossing  (standing or playing) - masked by parked or stationary vehicle',
+        'Walking along in carriageway, facing traffic', 'Walking along in carriageway, back to traffic',
+        'Unknown or other', 'Data missing or out of range'
+    ],
+    'car_passenger': [
+        'Not car passenger', 'Front seat passenger', 'Rear seat passenger', 'unknown (self reported)',
+        'Data missing or out of range'
+    ],
+    'bus_or_coach_passenger': [
+        'Not a bus or coach passenger', 'Boarding', 'Alighting', 'Standing passenger', 'Seated passenger',
+        'unknown (self reported)', 'Data missing or out of range'
+    ],
+    'pedestrian_road_maintenance_worker': [
+        'No / Not applicable', 'Yes', 'Not Known', 'Probable', 'Data missing or out of range'
+    ],
+    'casualty_type': [
+        'Pedestrian', 'Cyclist', 'Motorcycle 50cc and under rider or passenger',
+        'Motorcycle 125cc and under rider or passenger', 'Motorcycle over 125cc and up to 500cc rider or passenger',
+        'Motorcycle over 500cc rider or passenger', 'Taxi/Private hire car occupant', 'Car occupant',
+        'Minibus (8 - 16 passenger seats) occupant', 'Bus or coach occupant (17 or more pass seats)', 'Horse rider',
+        'Agricultural vehicle occupant', 'Tram occupant', 'Van / Goods vehicle (3.5 tonnes mgw or under) occupant',
+        'Goods vehicle (over 3.5t. and under 7.5t.) occupant', 'Goods vehicle (7.5 tonnes mgw and over) occupant',
+        'Mobility scooter rider', 'Electric motorcycle rider or passenger', 'Other vehicle occupant',
+        'Motorcycle - unknown cc rider or passenger', 'Goods vehicle (unknown weight) occupant',
+        'Unknown vehicle type (self rep only)', 'Motorcycle - Scooter (1979-1998)', 'Motorcycle (1979-1998)',
+        'Motorcycle - Combination (1979-1998)', 'Motorcycle over 125cc (1999-2004)',
+        'Taxi (excluding private hire cars) (1979-2004)', 'Car (including private hire cars) (1979-2004)',
+        'Minibus/Motor caravan (1979-1998)', 'Goods over 3.5 tonnes (1979-1998)'
+    ],
+    'casualty_imd_decile': [
+        'Most deprived 10%', 'More deprived 10-20%', 'More deprived 20-30%', 'More deprived 30-40%',
+        'More deprived 40-50%', 'Less deprived 40-50%', 'Less deprived 30-40%', 'Less deprived 20-30%',
+        'Less deprived 10-20%', 'Least deprived 10%', 'Data missing or out of range'
+    ],
+    'casualty_home_area_type': [
+        'Urban area', 'Small town', 'Rural', 'Data missing or out of range'
+    ],
+}
+
+# Label columns without a natural order, their categories are sorted alphabetically
+SORTED_LABEL_COLUMNS = ['police_force', 'local_authority_district', 'local_authority_ons_district',
+                        'local_authority_highway']
+
+# Numeric codes that are still present in some exports, decoded the same way as in the notebook
+LABEL_CODES = {
+    'day_of_week': dict(enumerate(DAYS, start=1)),
+}
+
+# Names of labels that the cleaning notebook did not decode. They are applied before the labels are encoded, so the
+# codes written by data/build.py already hold the merged labels
+LABEL_NAMES = {
+    'local_authority_ons_district': {
+        'E06000057': 'Northumberland',
+        'E06000058': 'Bournemouth, Christchurch, Poole',
+        'E06000059': 'Dorset',
+        'E06000060': 'Buckinghamshire',
+        'E06000061': 'North Northamptonshire',
+        'E06000062': 'West Northamptonshire',
+        'E08000037': 'Gateshead',
+        'S12000047': 'Fife',
+        'S12000048': 'Perth and Kinross',
+        'S12000049': 'Glasgow City',
+        'S12000050': 'North Lanarkshire'
+    },
+}
+
+
+def relabel(values, mapping):
+    """
+    Replaces labels of a text column, whether it is stored as objects or as a Categorical.
+
+    Categoricals whose labels stay distinct only get new categories, so (possibly memory-mapped) codes stay
+    shared, and are returned as they are when no label changes. Labels that become equal to another label are
+    merged, which rebuilds the codes: the columnar build applies LABEL_NAMES before it writes the codes, so this
+    only happens for the CSV and for builds written before the names were applied.
+
+    Parameters:
+    - values: The Series to relabel.
+    - mapping: Dictionary of old label to new label.
+
+    Returns:
+    - The relabelled Series.
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.replace(mapping)
+
+    categories = values.cat.categories
+    if not categories.isin(list(mapping)).any():
+        return values
+    labels = pd.Index([mapping.get(label, label) for label in categories])
+    if not labels.is_unique:
+        return values.astype(object).replace(mapping).astype('category')
+    relabelled = pd.Categorical.from_codes(values.cat.codes.to_numpy(), categories=labels, validate=False)
+    return pd.Series(relabelled, index=values.index, name=values.name)
+
+
+def categorize(values, column):
+    """
+    Converts a label column to a pandas Categorical with the fixed category order of the schema.
+
+    Labels that are not part of the schema are kept and appended after the known ones in sorted order,
+    so no value is lost. A column that already has the right categories is returned as it is, which
+    keeps memory-mapped codes shared.
+
+    Parameters:
+    - values: The Series to convert.
+    - column: The column name used to look up the category order.
+
+    Returns:
+    - The Series as a Categorical.
+    """
+    if column in LABEL_CODES and pd.api.types.is_numeric_dtype(values.dtype):
+        values = values.map(LABEL_CODES[column])
+    elif pd.api.types.is_integer_dtype(values.dtype):
+        # Fully numeric label columns such as speed_limit, labels are kept as text like the decoded columns
+        values = values.astype(str)
+
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+
+    present = values.cat.categories
+    order = LABEL_ORDERS.get(column, [])
+    extra = sorted(present.difference(order), key=str)
+    categories = order + extra
+    if list(present) == categories:
+        return values
+    return values.cat.set_categories(categories)
+
+
+def codes_of(values):
+    """
+    Returns the integer codes and the labels of a label column, e.g. to count or index its rows with numpy.
+    Columns that are not Categoricals yet are categorized first.
+
+    Parameters:
+    - values: The Series to encode.
+
+    Returns:
+    - Numpy array of the code of every row, -1 where the value is missing.
+    - The labels as a pandas Index, the code of a label is its position.
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    return values.cat.codes.to_numpy(), values.cat.categories
+
+
+def apply_schema(data):
+    """
+    Converts every label column of the dataset known to the schema to a Categorical, so filters,
+    groupbys and isin checks run on the integer codes instead of comparing strings. Labels that the
+    notebook left as codes get their names from LABEL_NAMES first.
+
+    Parameters:
+    - data: The merged collision DataFrame.
+
+    Returns:
+    - The same DataFrame, with its label columns converted.
+    """
+    for column in list(LABEL_ORDERS) + SORTED_LABEL_COLUMNS:
+        if column in data.columns:
+            data[column] = categorize(relabel(data[column], LABEL_NAMES.get(column, {})), column)
+    return data
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+
+
+# Mean radius of the earth, haversine distances are in km
+EARTH_RADIUS_KM = 6371.0088
+
+
+class SpatialIndex:
+    """
+    Spatial index over the coordinates of the collisions, for bounding box, radius and nearest neighbour queries.
+
+    Rows are kept sorted by latitude, so a bounding box only tests the longitude of the rows within its latitude
+    band, found by binary search. Radius and nearest neighbour queries use a ball tree with the haversine metric,
+    which is built (and scikit-learn imported) on the first such query so that start-up does not pay for it.
+    Rows without coordinates are not indexed.
+    """
+
+    def __init__(self, data):
+        """
+        Builds the index.
+
+        Parameters:
+        - data: DataFrame with latitude and longitude columns.
+        """
+        latitude = data['latitude'].to_numpy(dtype=float)
+        longitude = data['longitude'].to_numpy(dtype=float)
+        self.rows = len(data)
+        located = np.flatnonzero(np.isfinite(latitude) & np.isfinite(longitude))
+        self.order = located[np.argsort(latitude[located], kind='stable')].astype(np.int32)
+        self.latitude = latitude[self.order]
+        self.longitude = longitude[self.order]
+        self._tree = None
+        self._lock = threading.Lock()
+
+    def box(self, bounds):
+        """
+        Finds the rows within a bounding box.
+
+        Parameters:
+        - bounds: [west, south, east, north] in degrees.
+
+        Returns:
+        - Sorted integer array of the row positions.
+        """
+        west, south, east, north = bounds
+        start = np.searchsorted(self.latitude, south, side='left')
+        stop = np.searchsorted(self.latitude, north, side='right')
+        longitude = self.longitude[start:stop]
+        return np.sort(self.order[start:stop][(longitude >= west) & (longitude <= east)])
+
+    def box_mask(self, bounds):
+        """
+        Finds the rows within a bounding box, as a boolean mask that can be combined with the filter masks.
+        """
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[self.box(bounds)] = True
+        return mask
+
+    def _ball_tree(self):
+        """
+        Returns the ball tree over the coordinates in radians, built on first use.
+        """
+        with self._lock:
+            if self._tree is None:
+                # scikit-learn takes over a second to import, so it is only imported when a tree is needed
+                from sklearn.neighbors import BallTree
+                self._tree = BallTree(np.radians(np.column_stack([self.latitude, self.longitude])),
+                                      metric='haversine')
+            return self._tree
+
+    def radius(self, latitude, longitude, km):
+        """
+        Finds the rows within a distance of a point.
+
+        Parameters:
+        - latitude, longitude: The point in degrees.
+        - km: The distance in km.
+
+        Returns:
+        - Integer array of the row positions, from the nearest to the farthest.
+        - Float array of their distances in km.
+        """
+        if not len(self.order):
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        point = np.radians([[latitude, longitude]])
+        indices, distances = self._ball_tree().query_radius(point, r=km / EARTH_RADIUS_KM, return_distance=True,
+                                                            sort_results=True)
+        return self.order[indices[0]], distances[0] * EARTH_RADIUS_KM
+
+    def nearest(self, latitude, longitude, k=1):
+        """
+        Finds the k rows nearest to a point.
+
+        Parameters:
+        - latitude, longitude: The point in degrees.
+        - k: The number of rows to find.
+
+        Returns:
+        - Integer array of the row positions, from the nearest to the farthest.
+        - Float array of their distances in km.
+        """
+        k = min(k, len(self.order))
+        if k == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        distances, indices = self._ball_tree().query(np.radians([[latitude, longitude]]), k=k)
+        return self.order[indices[0]], distances[0] * EARTH_RADIUS_KM
+
+    def memory_usage(self):
+        """
+        Returns the memory held by the index in bytes, without the ball tree when it was not built.
+        """
+        tree = 0 if self._tree is None else sum(array.nbytes for array in self._tree.get_arrays())
+        return self.order.nbytes + self.latitude.nbytes + self.longitude.nbytes + tree
@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+
+
+# Tables of the dataset, from the coarsest grain to the finest
+TABLES = ['collision', 'vehicle', 'casualty']
+# What one row of every table counts, for axis and legend titles
+GRAIN_LABELS = {'collision': 'Collisions', 'vehicle': 'Vehicles', 'casualty': 'Casualties'}
+
+# First column of the vehicle and of the casualty block in the merged CSV. data_cleaning_and_merging.ipynb merges
+# collision -> vehicle -> casualty on accident_index, so pandas suffixes the repeated key columns of the first two
+# merges with _x/_y and leaves the ones of the casualty table as they are
+VEHICLE_START = 'accident_year_y'
+CASUALTY_START = 'accident_year'
+
+# Columns of the vehicle and casualty blocks that repeat the collision key, or are renamed by the split
+DUPLICATE_KEYS = ['accident_year_y', 'accident_reference_y', 'accident_year', 'accident_reference']
+VEHICLE_REFERENCES = {'vehicle_reference_x': 'vehicle_reference', 'vehicle_reference_y': 'vehicle_reference'}
+
+
+def _keys(collision_id, reference):
+    """
+    Combines a collision id and a reference within the collision (e.g. the vehicle reference) into one integer.
+    """
+    return collision_id.astype(np.int64) * (1 << 20) + reference.astype(np.int64)
+
+
+def split_tables(data):
+    """
+    Splits the merged collision data into one table per grain.
+
+    The notebook left-joins collisions, vehicles and casualties on accident_index, so the merged file holds one row
+    per (collision, vehicle, casualty) combination of a collision and repeats the collision columns on every row.
+    This keeps every collision, vehicle and casualty once and links them through integer row ids:
+
+    - collision: the collision columns, one row per accident_index.
+    - vehicle: the vehicle columns and collision_id, the row of its collision. number_of_casualties holds the number
+      of casualties that refer to the vehicle.
+    - casualty: the casualty columns, collision_id, and vehicle_id, the row of the vehicle the casualty refers to
+      (-1 if it is not in the data). number_of_casualties is 1, so sums of it count casualties at every grain.
+
+    Parameters:
+    - data: The merged collision DataFrame.
+
+    Returns:
+    - A CollisionTables.
+    """
+    columns = list(data.columns)
+    vehicle_start, casualty_start = columns.index(VEHICLE_START), columns.index(CASUALTY_START)
+    blocks = [columns[:vehicle_start], columns[vehicle_start:casualty_start], columns[casualty_start:]]
+    blocks = [[column for column in block if column not in DUPLICATE_KEYS] for block in blocks]
+
+    # Collisions in order of first appearance, which is the order of the collision file
+    collision_id, _ = pd.factorize(data['accident_index'])
+    first = np.zeros(len(data), dtype=bool)
+    first[np.unique(collision_id, return_index=True)[1]] = True
+    collisions = data.loc[first, blocks[0]].reset_index(drop=True)
+
+    def unique_rows(reference, block):
+        # Rows of the left join without a match have no reference
+        reference = data[reference].to_numpy(dtype=float)
+        present = np.flatnonzero(~np.isnan(reference))
+        keys = _keys(collision_id[present], reference[present])
+        keys, first_rows = np.unique(keys, return_index=True)
+        rows = present[first_rows]
+        table = data.iloc[rows][block].rename(columns=VEHICLE_REFERENCES).reset_index(drop=True)
+        table['collision_id'] = collision_id[rows].astype(np.int32)
+        return table, keys
+
+    vehicles, vehicle_keys = unique_rows('vehicle_reference_x', blocks[1])
+    casualties, _ = unique_rows('casualty_reference', blocks[2])
+
+    # Link every casualty to the vehicle it refers to, the vehicle keys are sorted by np.unique
+    references = casualties['vehicle_reference'].to_numpy(dtype=float)
+    keys = _keys(casualties['collision_id'].to_numpy(), np.nan_to_num(references, nan=-1))
+    vehicle_id = np.full(len(casualties), -1, dtype=np.int32)
+    if len(vehicle_keys):
+        position = np.minimum(np.searchsorted(vehicle_keys, keys), len(vehicle_keys) - 1)
+        found = (vehicle_keys[position] == keys) & ~np.isnan(references)
+        vehicle_id[found] = position[found]
+    casualties['vehicle_id'] = vehicle_id
+
+    vehicles['number_of_casualties'] = np.bincount(vehicle_id[vehicle_id >= 0], minlength=len(vehicles))
+    casualties['number_of_casualties'] = np.ones(len(casualties), dtype=np.int64)
+    return CollisionTables(collisions, vehicles, casualties)
+
+
+def _take(values, rows):
+    """
+    Takes rows of a column by position, -1 gives a missing value.
+    """
+    array = values.array
+    if len(rows) and rows.min() < 0:
+        return pd.api.extensions.take(array, rows, allow_fill=True)
+    return array.take(rows)
+
+
+class CollisionTables:
+    """
+    The collision, vehicle and casualty tables of the dataset, linked by integer row ids (see split_tables).
+
+    Charts ask for the columns they need with frame(), which answers at the finest grain among them, so that
+    every collision, vehicle or casualty is counted once.
+    """
+
+    def __init__(self, collisions, vehicles, casualties):
+        """
+        Initializes the tables.
+
+        Parameters:
+        - collisions: DataFrame with one row per collision.
+        - vehicles: DataFrame with one row per vehicle and its collision_id.
+        - casualties: DataFrame with one row per casualty, its collision_id and vehicle_id.
+        """
+        self.collisions = collisions
+        self.vehicles = vehicles
+        self.casualties = casualties
+        self.tables = dict(zip(TABLES, [collisions, vehicles, casualties]))
+
+    def table_of(self, column):
+        """
+        Returns the name of the coarsest table holding the column.
+        """
+        for name, table in self.tables.items():
+            if column in table.columns:
+                return name
+        raise KeyError(column)
+
+    def grain(self, columns):
+        """
+        Returns the name of the finest table among those of the columns, the table frame() counts the rows of.
+        """
+        return max((self.table_of(column) for column in columns), key=TABLES.index)
+
+    def frame(self, columns, mask=None):
+        """
+        Materializes columns of the tables at the finest grain among them.
+
+        Each column is taken from the table of that grain when it has it, and otherwise from the vehicle or
+        collision the row belongs to. For example vehicle_type and accident_severity give one row per vehicle
+        with the severity of its collision.
+
+        Parameters:
+        - columns: The columns to materialize.
+        - mask: Boolean mask over the collision table, or None to keep every collision.
+
+        Returns:
+        - A new DataFrame with one row per matching collision, vehicle or casualty.
+        """
+        columns = list(dict.fromkeys(columns))  # Drop duplicates, e.g. when both heatmap axes are the same
+        grain = self.grain(columns)
+        table = self.tables[grain]
+
+        if grain == 'collision':
+            rows = np.arange(len(table)) if mask is None else np.flatnonzero(mask)
+        else:
+            collision_id = table['collision_id'].to_numpy()
+            rows = np.arange(len(table)) if mask is None else np.flatnonzero(mask[collision_id])
+
+        parents = {'collision': rows if grain == 'collision' else table['collision_id'].to_numpy()[rows]}
+        if grain == 'casualty':
+            parents['vehicle'] = table['vehicle_id'].to_numpy()[rows]
+        parents[grain] = rows
+
+        result = {}
+        for column in columns:
+            # Prefer the finest table that has the column
+            name = next(name for name in reversed(TABLES) if name in parents and column in self.tables[name].columns)
+            if mask is None and name == grain:
+                # Every row of the table is kept, its column is used as it is instead of being copied
+                result[column] = self.tables[name][column].array
+            else:
+                result[column] = _take(self.tables[name][column], parents[name])
+        return pd.DataFrame(result, copy=False)
+
+    def sort_collisions(self, order):
+        """
+        Reorders the collisions, and the vehicles and casualties with them, keeping the row ids linked.
+
+        The vehicles and casualties are stably sorted by their new collision_id, so every table follows the new
+        collision order and the rows of a collision stay together.
+
+        Parameters:
+        - order: The new order of the collision rows, a permutation of their positions.
+
+        Returns:
+        - A new CollisionTables.
+        """
+        order = np.asarray(order)
+        position = np.empty(len(order), dtype=np.int32)
+        position[order] = np.arange(len(order), dtype=np.int32)
+        collisions = self.collisions.take(order).reset_index(drop=True)
+
+        def follow(table):
+            # The new collision_id of every row, and the stable order that sorts the table by it
+            collision_id = position[table['collision_id'].to_numpy()]
+            rows = np.argsort(collision_id, kind='stable')
+            table = table.take(rows).reset_index(drop=True)
+            table['collision_id'] = collision_id[rows]
+            return table, rows
+
+        vehicles, vehicle_rows = follow(self.vehicles)
+        casualties, _ = follow(self.casualties)
+        vehicle_position = np.empty(len(vehicle_rows), dtype=np.int32)
+        vehicle_position[vehicle_rows] = np.arange(len(vehicle_rows), dtype=np.int32)
+        vehicle_id = casualties['vehicle_id'].to_numpy()
+        casualties['vehicle_id'] = np.where(vehicle_id >= 0, vehicle_position[np.maximum(vehicle_id, 0)], -1)
+        return CollisionTables(collisions, vehicles, casualties)
+
+    def memory_usage(self):
+        """
+        Returns the memory held by the tables in bytes.
+        """
+        return sum(table.memory_usage(deep=True).sum() for table in self.tables.values())
@@ -0,0 +1,178 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from data.grid import tile_x, tile_y
+from data.schema import codes_of
+
+
+# Most points the map shows in the 'all' display option, fatal collisions come on top of this
+MAX_MAP_POINTS = 20000
+# Share of the collisions of a local authority left out on each side of its viewport, e.g. misplaced coordinates
+VIEWPORT_TRIM = 0.01
+# Size in pixels of the map the viewport of a local authority is fitted to, and the closest zoom it gets
+MAP_WIDTH, MAP_HEIGHT = 800, 600
+MAX_ZOOM = 15
+
+
+def viewport_bounds(relayout_data):
+    """
+    Reads the visible area of a map from its relayoutData.
+
+    The bounds are widened to a grid that depends on the size of the area, so small pans map to the same
+    bounds (and to the same cached figure) and points just outside the view are already there while panning.
+
+    Parameters:
+    - relayout_data: The relayoutData of the map graph.
+
+    Returns:
+    - [west, south, east, north] in degrees, or None when relayoutData does not hold the map bounds
+      (e.g. before the first pan or zoom).
+    """
+    if not relayout_data or 'mapbox._derived' not in relayout_data:
+        return None
+    corners = np.asarray(relayout_data['mapbox._derived'].get('coordinates', []), dtype=float)
+    if corners.shape != (4, 2) or not np.isfinite(corners).all():
+        return None
+    west, south = corners.min(axis=0)
+    east, north = corners.max(axis=0)
+
+    # Snap outwards to a step of a quarter of the span, rounded to a power of two
+    span = max(east - west, north - south, 1e-6)
+    step = 2.0 ** math.floor(math.log2(span)) / 4
+    return [math.floor(west / step) * step, math.floor(south / step) * step,
+            math.ceil(east / step) * step, math.ceil(north / step) * step]
+
+
+def viewport_zoom(relayout_data):
+    """
+    Reads the zoom level of a map from its relayoutData.
+
+    Parameters:
+    - relayout_data: The relayoutData of the map graph.
+
+    Returns:
+    - The zoom level, or None when relayoutData does not hold it.
+    """
+    if not relayout_data or 'mapbox.zoom' not in relayout_data:
+        return None
+    zoom = float(relayout_data['mapbox.zoom'])
+    return zoom if math.isfinite(zoom) else None
+
+
+def decimate(data, bounds=None, max_points=MAX_MAP_POINTS):
+    """
+    Picks at most max_points representative collisions within the bounds, plus every fatal collision.
+
+    Points outside the bounds are dropped. When more remain than the budget allows, the bounds are split into a
+    grid and every cell keeps one point per accident severity, the one with the most casualties, so that dense
+    and sparse areas and every severity stay visible. The grid is sized to come close to the budget.
+
+    Parameters:
+    - data: DataFrame with latitude, longitude, accident_severity and number_of_casualties columns.
+    - bounds: [west, south, east, north] of the visible area, or None for the extent of data.
+    - max_points: Budget of non-fatal points.
+
+    Returns:
+    - The selected rows of data, in their original order.
+    """
+    latitude = data['latitude'].to_numpy(dtype=float)
+    longitude = data['longitude'].to_numpy(dtype=float)
+    visible = np.isfinite(latitude) & np.isfinite(longitude)
+    if bounds is not None:
+        west, south, east, north = bounds
+        visible &= (longitude >= west) & (longitude <= east) & (latitude >= south) & (latitude <= north)
+    elif visible.any():
+        west, east = longitude[visible].min(), longitude[visible].max()
+        south, north = latitude[visible].min(), latitude[visible].max()
+
+    fatal = visible & (data['accident_severity'] == 'Fatal').to_numpy()
+    rest = np.flatnonzero(visible & ~fatal)
+    if len(rest) > max_points:
+        # Visit the rows with the most casualties first, so they represent their cell
+        rest = rest[np.argsort(-data['number_of_casualties'].to_numpy(dtype=float)[rest], kind='stable')]
+        severity = codes_of(data['accident_severity'])[0][rest]
+        x = (longitude[rest] - west) / max(east - west, 1e-9)
+        y = (latitude[rest] - south) / max(north - south, 1e-9)
+
+        # Collisions cluster along roads and in towns, so most grid cells are empty and the number of points a
+        # grid keeps is not known up front. Refine or coarsen the grid towards the budget, keeping the finest
+        # grid that fits
+        cells = int(math.sqrt(max_points))
+        best = None
+        for _ in range(8):
+            column = np.minimum((x * cells).astype(np.int64), cells - 1)
+            row = np.minimum((y * cells).astype(np.int64), cells - 1)
+            key = (row * cells + column) * 8 + severity + 1  # Missing severities (-1) form their own group
+            _, first = np.unique(key, return_index=True)
+            if len(first) <= max_points:
+                if best is None or len(first) > len(best):
+                    best = first
+                if len(first) > 0.8 * max_points:
+                    break
+                cells = min(int(cells * math.sqrt(max_points / max(len(first), 1))) + 1, 1 << 20)
+            else:
+                cells = max(1, min(cells - 1, int(cells / math.sqrt(len(first) / max_points))))
+        if best is None:
+            # Keep the representatives with the most casualties, they come first in rest
+            best = np.sort(first)[:max_points]
+        rest = rest[best]
+
+    selected = np.zeros(len(data), dtype=bool)
+    selected[fatal] = True
+    selected[rest] = True
+    return data[selected]
+
+
+def authority_viewports(data, by='local_authority_ons_district', trim=VIEWPORT_TRIM):
+    """
+    Computes the initial view of the map for every local authority.
+
+    The viewport of a local authority spans its collisions between the trim and 1 - trim quantiles of latitude and
+    longitude, so a few misplaced coordinates do not zoom the map out. The map is centered on it and zoomed in
+    as far as it fits in a map of MAP_WIDTH x MAP_HEIGHT pixels.
+
+    Parameters:
+    - data: DataFrame with latitude and longitude columns and the grouping column.
+    - by: The column to group by.
+    - trim: Share of the collisions left out on each side.
+
+    Returns:
+    - DataFrame indexed by the labels of the grouping column, with the center (latitude, longitude), the zoom and
+      the bounds (west, south, east, north) of every label that has located collisions.
+    """
+    codes, labels = codes_of(data[by])
+    latitude = data['latitude'].to_numpy(dtype=float)
+    longitude = data['longitude'].to_numpy(dtype=float)
+    located = np.flatnonzero((codes >= 0) & np.isfinite(latitude) & np.isfinite(longitude))
+    codes = codes[located]
+
+    # Row counts and the first position of every group in an order sorted by group
+    counts = np.bincount(codes, minlength=len(labels))
+    groups = np.flatnonzero(counts)
+    starts = (np.cumsum(counts) - counts)[groups]
+    sizes = counts[groups]
+
+    def quantiles(coordinate):
+        # Sort by coordinate, then stably by group, so every group is a sorted run
+        order = np.argsort(coordinate, kind='stable')
+        order = order[np.argsort(codes[order], kind='stable')]
+        sorted_values = coordinate[order]
+        low = sorted_values[starts + np.floor(trim * (sizes - 1)).astype(np.int64)]
+        high = sorted_values[starts + np.ceil((1 - trim) * (sizes - 1)).astype(np.int64)]
+        return low, high
+
+    south, north = quantiles(latitude[located])
+    west, east = quantiles(longitude[located])
+
+    # Fit the bounds in Web Mercator, where a zoom level is 256 pixels for the whole world
+    with np.errstate(divide='ignore'):
+        width = (tile_x(east, 0) - tile_x(west, 0)) * 256
+        height = (tile_y(south, 0) - tile_y(north, 0)) * 256
+        zoom = np.minimum(np.log2(MAP_WIDTH / width), np.log2(MAP_HEIGHT / height))
+
+    return pd.DataFrame({'latitude': (south + north) / 2, 'longitude': (west + east) / 2,
+                         'zoom': np.minimum(zoom, MAX_ZOOM),
+                         'west': west, 'south': south, 'east': east, 'north': north},
+                        index=labels[groups])
@@ -4,6 +4,7 @@ from dash import html, dcc, Input, Output, State
 from dash import callback_context
 import dash_bootstrap_components as dbc
 import calendar
+from functools import lru_cache
 
 from plots.map import MapBox
 from plots.hbar import HorizontalBarChart
@@ -11,6 +12,16 @@ from plots.line import LineChart
 from plots.heatmap import HeatMap
 import plotly.graph_objects as go
 from README import readme_html
+from data.loader import dataset_hash, load_tables
+from data.filters import month_labels, select
+from data.index import BitmapIndex
+from data.cube import DataCube
+from data.cache import cache_key, open_figure_cache
+from data.viewport import MAX_MAP_POINTS, authority_viewports, viewport_bounds, viewport_zoom
+from data.grid import GridPyramid
+from data.spatial import SpatialIndex
+from data.pairs import load_pair_counts
+from data.association import rank_associations
 
 
 # Dash App initialization
@@ -21,7 +32,10 @@ app = dash.Dash(__name__, suppress_callback_exceptions=True,
                     '/assets/style.css'
                 ])
 app.title = 'VisTool'
-df = pd.read_csv('merged_collision_data.csv', low_memory=False, on_bad_lines='skip')
+# Loads the columnar build when present (see data/build.py), otherwise parses the CSV. The merged rows are split into
+# collision, vehicle and casualty tables (see data/tables.py), the map and the filters work on the collision table
+tables = load_tables()
+df = tables.collisions
 
 
 # Colours used throughout pages
@@ -33,28 +47,58 @@ elegant_colors = {
     'background_darker': '#D8DCDC'
 }
 
-map = MapBox(html_id='map-graph', data=df)
-hbar = HorizontalBarChart(html_id='hbar-graph', data=df)
-line = LineChart(html_id='line-graph', data=df)
-heatmap = HeatMap(html_id='heatmap-graph', data=df)
+# Style of the box under the map legend that shows the collisions near a clicked point
+nearby_style = {
+    'backgroundColor': 'rgba(255, 255, 255, 0.8)',
+    'padding': '10px',
+    'borderRadius': '5px',
+    'boxShadow': 'rgba(0, 0, 0, 0.15) 1.95px 1.95px 2.6px',
+    'border': '1px solid black',
+    'width': '120px',
+    'fontSize': '10px',
+    'color': '#383838'
+}
+
+# Columns used by the map to plot single collisions
+map_columns = ['local_authority_ons_district', 'latitude', 'longitude', 'number_of_casualties', 'accident_severity']
+# Distance around a clicked point of the map within which collisions are counted
+nearby_radius_km = 1
+# Attributes of the heatmap dropdowns, see heatmap_masking()
+heatmap_labels = ['First Point of Impact', 'Pedestrian Movement', 'Junction Location', 'Junction Control',
+                  'Casualty Class', 'Vehicle Manoeuvre']
+# List of possible representations of missing values
+missing_values = ['Unknown', 'Not known', 'Other/Not known', 'Other', 'Undefined', 'Data missing or out of range',
+                  'Data missing', 'Unclassified', 'Unallocated', 'unknown (self reported)',
+                  'Unknown vehicle type (self rep only)', 'Other vehicle', -1, -1.0, 'Unknown (self reported)',
+                  'Unknown or other']
 
 
 month_to_abbr = {month: abbr for month, abbr in zip(calendar.month_name[1:], calendar.month_abbr[1:])}
 months = {i + 1: {'label': abbr} for i, abbr in enumerate(calendar.month_abbr[1:])}
 
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('E06000057', 'Northumberland')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('E06000058', 'Bournemouth,'
-                                                                                             ' Christchurch, Poole')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('E06000059', 'Dorset')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('E06000060', 'Buckinghamshire')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('E06000061', 'North Northamptonshire')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('E06000062', 'West Northamptonshire')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('E08000037', 'Gateshead')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('S12000047', 'Fife')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('S12000048', 'Perth and Kinross')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('S12000049', 'Glasgow City')
-df['local_authority_ons_district'] = df['local_authority_ons_district'].replace('S12000050', 'North Lanarkshire')
-
+# The charts hold no data and build no figure until a callback or a tab layout asks for one. The map looks up the
+# initial view of every local authority, computed once the labels are final
+map = MapBox(html_id='map-graph', views=authority_viewports(df))
+hbar = HorizontalBarChart(html_id='hbar-graph')
+line = LineChart(html_id='line-graph')
+heatmap = HeatMap(html_id='heatmap-graph')
+
+# Bitmap index over the filter columns of the map and bar chart tabs, built once the labels are final
+filter_index = BitmapIndex(df)
+# Per local authority measures over the same filter columns, answers the 'Aggregated' map display option
+map_cube = DataCube(df)
+# Collision counts on a multi-resolution grid, answers the 'Density' map display option
+map_grid = GridPyramid(df)
+# Spatial index over the collision coordinates, for the visible area and the collisions near a clicked point
+spatial_index = SpatialIndex(df)
+# Counts of every pair of heatmap attributes, written with the columnar build, so the heatmap does not read the rows
+heatmap_pairs = load_pair_counts(tables)
+# Serialized outputs of the chart callbacks, so a view that was shown before is not rebuilt. By default they are
+# stored on disk and shared by all workers, keyed by the content of the dataset (see data/cache.py)
+figure_cache = open_figure_cache(namespace=dataset_hash())
+# Sorted labels of the dropdown filters that occur in the data, shared by the layouts of the map and bar chart tabs
+filter_labels = {column: sorted(df[column].dropna().unique())
+                 for column in ['local_authority_ons_district', 'accident_severity']}
 
 
 def build_left_container_mapbox():
@@ -65,9 +109,9 @@ def build_left_container_mapbox():
        to display total casualties and a tree map.
        """
 
-    # Get sorted unique local authorities and accident severities from the dataframe
-    local_authorities = sorted(df['local_authority_ons_district'].unique())
-    acc_sev = sorted(df['accident_severity'].unique())
+    # Get sorted unique local authorities and accident severities from the precomputed labels
+    local_authorities = filter_labels['local_authority_ons_district']
+    acc_sev = filter_labels['accident_severity']
 
     # Create the layout of the left container
     return html.Div(
@@ -142,7 +186,8 @@ def build_left_container_mapbox():
                         id='display-options',
                         options=[
                             {'label': 'All', 'value': 'all'},
-                            {'label': 'Aggregated', 'value': 'aggregated'}
+                            {'label': 'Aggregated', 'value': 'aggregated'},
+                            {'label': 'Density', 'value': 'density'}
                         ],
                         value='aggregated',
                         labelStyle={'display': 'inline-block', 'margin-right': '10px'},
@@ -193,102 +238,99 @@ def toggle_button():
     )
 
 
+# Branches of the tree map: their title and the columns of their levels, with the name of the placeholder node each
+# level hangs under (the first level hangs under the title)
+treemap_branches = [
+    ("Weather Conditions", [('weather_conditions', None),
+                            ('road_surface_conditions', "Road Conditions"),
+                            ('light_conditions', "Light Conditions")]),
+    ("Area Type", [('urban_or_rural_area', None),
+                   ('road_type', "Road Type"),
+                   ('speed_limit', "Speed Limit")])
+]
+
+
+def treemap_hierarchy():
+    """
+        Builds the nodes of the tree map of weather conditions, road conditions, light conditions, area types,
+        road types, and speed limits from the collision counts of the cube.
+
+        Only combinations of labels that occur in the data are nodes, and every node is sized by its number of
+        collisions. The counts of a level are summed from the counts of the finest level, without the rows. Every
+        collision is counted once in each branch, so the root is only a container: its value, the sum of the
+        branches that 'total' branch values require, is not a number of collisions and is not shown.
+
+        Returns:
+        - DataFrame with the ids, labels, parents, values and hover texts of the nodes, and their selections: the
+          list of (column name, label) pairs along the path of the node.
+        """
+    ids, labels, parents, values, selections = ["All"], ["All"], [""], [0], [[]]
+
+    def add(node_id, label, parent, value, selection):
+        ids.append(node_id)
+        labels.append(label)
+        parents.append(parent)
+        values.append(value)
+        selections.append(selection)
+
+    for title, levels in treemap_branches:
+        columns = [column for column, _ in levels]
+        counts = map_cube.counts(columns)
+        values[0] += int(counts['count'].sum())
+        add(title, title, "All", int(counts['count'].sum()), [])
+
+        # Node ids are the path of labels from the title, so the same label in two branches gets two nodes
+        node_ids, node_values = {(): title}, {(): int(counts['count'].sum())}
+        for depth, (column, placeholder) in enumerate(levels):
+            level_counts = counts.groupby(columns[:depth + 1], observed=True)['count'].sum()
+            placeholders = set()
+            for path, value in level_counts.items():
+                path = path if isinstance(path, tuple) else (path,)
+                parent = node_ids[path[:-1]]
+                if placeholder is not None:
+                    # The placeholder node of the level is added once under every parent, with the parent's count
+                    if path[:-1] not in placeholders:
+                        placeholders.add(path[:-1])
+                        add(f"{parent} - {placeholder}", placeholder, parent, node_values[path[:-1]],
+                            list(zip(columns, path[:-1])))
+                    parent = f"{parent} - {placeholder}"
+                node_ids[path], node_values[path] = f"{parent} - {path[-1]}", int(value)
+                add(node_ids[path], path[-1], parent, int(value), list(zip(columns, path)))
+
+    # Create a DataFrame from the hierarchical data. The root is a container of the branches, which each count
+    # every collision, so it gets no count in its hover text
+    return pd.DataFrame({
+        'ids': ids,
+        'labels': labels,
+        'parents': parents,
+        'values': values,
+        'hover': ["Each branch splits all collisions"] + [f"Collisions: {value}" for value in values[1:]],
+        'selections': selections
+    })
+
+
+# Nodes of the tree map, built once from the cube, and the selections of every node id, so a click on the tree map
+# is a dictionary lookup whatever the depth of the node
+treemap_nodes = treemap_hierarchy()
+treemap_selections = dict(zip(treemap_nodes['ids'], treemap_nodes['selections']))
+
+
 def tree_map():
     """
         Creates a hierarchical tree map visualization for various conditions affecting road safety.
         The tree map includes weather conditions, road conditions, light conditions, area types,
         road types, and speed limits.
         """
-
-    # Define the data
-    weather_conditions = ["Fine no high winds", "Raining no high winds", "Snowing no high winds",
-                          "Fine + high winds", "Raining + high winds", "Snowing + high winds", "Fog or mist", "Other"]
-    road_conditions = ["Dry", "Wet or damp", "Snow", "Frost or ice", "Flood over 3cm deep", "Oil or diesel", "Mud"]
-    light_conditions = ["Daylight", "Darkness + lights lit", "Darkness + lights unlit", "Darkness + no lighting",
-                        "Darkness - lighting unknown"]
-    urban_rural_areas = ["Urban", "Rural"]
-    road_types = ["Roundabout", "One way street", "Dual carriageway", "Single carriageway", "Slip road",
-                  "One way street/Slip road", "Unknown"]
-    speed_limits = ['20', '50', '30', '40', '60', '70']
-
-    ids = ["All", "Weather Conditions", "Area Type"]
-    labels = ["All", "Weather Conditions", "Area Type"]
-    parents = ["", "All", "All"]
-
-    # Expand Weather Conditions
-    for weather in weather_conditions:
-        ids.append(weather)
-        labels.append(weather)
-        parents.append("Weather Conditions")
-
-        road_label_id = f"{weather} - Road Conditions"
-        ids.append(road_label_id)
-        labels.append("Road Conditions")
-        parents.append(weather)
-
-        # Expand Road Surface Conditions for each Weather Condition
-        for road in road_conditions:
-            road_id = f"{road_label_id} - {road}"
-            ids.append(road_id)
-            labels.append(road)
-            parents.append(road_label_id)
-
-            # Add Light Conditions placeholder for each Road Surface Condition
-            light_label_id = f"{road_id} - Light Conditions"
-            ids.append(light_label_id)
-            labels.append("Light Conditions")
-            parents.append(road_id)
-
-            # Expand Light Conditions for each Road Condition
-            for light in light_conditions:
-                light_id = f"{light_label_id} - {light}"
-                ids.append(light_id)
-                labels.append(light)
-                parents.append(light_label_id)
-
-    # Expand Area Type
-    for area in urban_rural_areas:
-        area_id = f"{area}"
-        ids.append(area_id)
-        labels.append(area)
-        parents.append("Area Type")
-
-        road_type_label_id = f"{area} - Road Type"
-        ids.append(road_type_label_id)
-        labels.append("Road Type")
-        parents.append(area_id)
-
-        # Add Road Types under each Urban or Rural Area
-        for road_type in road_types:
-            road_type_id = f"{road_type_label_id} - {road_type}"
-            ids.append(road_type_id)
-            labels.append(road_type)
-            parents.append(road_type_label_id)
-
-            # Add Speed Limit placeholder for each Road Type
-            speed_limit_label_id = f"{road_type_id} - Speed Limit"
-            ids.append(speed_limit_label_id)
-            labels.append("Speed Limit")
-            parents.append(road_type_id)
-
-            # Add Speed Limits under each Road Type
-            for speed in speed_limits:
-                speed_id = f"{speed_limit_label_id} - {speed}"
-                ids.append(speed_id)
-                labels.append(speed)
-                parents.append(speed_limit_label_id)
-    # Create a DataFrame from the hierarchical data
-    df = pd.DataFrame({
-        'ids': ids,
-        'labels': labels,
-        'parents': parents
-    })
     # Create the tree map figure
     fig = go.Figure()
     fig.add_trace(go.Treemap(
-        ids=df['ids'],
-        labels=df['labels'],
-        parents=df['parents'],
+        ids=treemap_nodes['ids'],
+        labels=treemap_nodes['labels'],
+        parents=treemap_nodes['parents'],
+        values=treemap_nodes['values'],
+        branchvalues='total',  # Nodes are sized by their own count, which is the sum of their children
+        customdata=treemap_nodes['hover'],
+        hovertemplate='%{label}<br>%{customdata}<extra></extra>',
         maxdepth=2,  # Adjust depth as needed
         root_color="lightgrey",
     ))
@@ -296,6 +338,9 @@ def tree_map():
     return dcc.Graph(id='treemap-graph', figure=fig, style={'height': '400px'})
 
 
+# Tab layouts hold no state and the data never changes while the app runs, so every tab is built once per process
+# and switching tabs afterwards does no data or figure work
+@lru_cache(maxsize=None)
 def build_map_tab():
     """
        Constructs the layout for the first page in our Dash app.
@@ -320,7 +365,9 @@ def build_map_tab():
                 },
                 children=[
                     # Function call to create the legend
-                    legend_type()
+                    legend_type(),
+                    # Collisions near the point clicked on the map, filled in by update_nearby
+                    html.Div(id='nearby-collisions', style={'display': 'none'})
                 ]
             ),
             # Main content container
@@ -340,7 +387,14 @@ def build_map_tab():
                         id='map-container',
                         style={'flex': 1},
                         children=[
-                            dcc.Graph(id='map-graph', figure=map.update(df, None, None), style={'flex': '1'})
+                            # Starts with the default 'aggregated' display option, which the map callback shows
+                            dcc.Graph(id='map-graph',
+                                      figure=build_map_figure(None, map_selections(None, None, None, None),
+                                                              'aggregated', None),
+                                      style={'flex': '1'}),
+                            # Visible area and zoom of the map, the 'all' and 'density' display options only send
+                            # the points or grid cells inside it
+                            dcc.Store(id='map-viewport')
                         ]
                     )
                 ]
@@ -411,9 +465,9 @@ def build_top_container_barChart():
         and various vehicle, collision, and road-related attributes.
         """
 
-    # Get sorted unique local authorities and accident severities from the dataframe
-    local_authorities = sorted(df['local_authority_ons_district'].unique())
-    acc_sev = sorted(df['accident_severity'].unique())
+    # Get sorted unique local authorities and accident severities from the precomputed labels
+    local_authorities = filter_labels['local_authority_ons_district']
+    acc_sev = filter_labels['accident_severity']
 
     return html.Div(
         style={
@@ -555,13 +609,11 @@ def build_top_container_barChart():
     )
 
 
-def build_bottom_line_container(df_filtered):
+def build_bottom_line_container():
     """
         Constructs the bottom container for a line chart visualization in our Dash app.
         This container includes a title, a dropdown for selecting the x-axis attribute,
         and the line chart itself.
-        Parameters:
-        - df_filtered: DataFrame with filtered data based on user selections.
         """
 
     return html.Div([
@@ -624,7 +676,7 @@ def build_bottom_line_container(df_filtered):
                         dcc.Graph(
                             id='line-chart',
                             # Function call to update the line chart with filtered data
-                            figure=line.update(df_filtered, None),
+                            figure=build_line_figure(None),
                             style={'width': '1000px', 'height': '500px', 'margin-left': '300px', 'margin-right': '20px'}
                         )
                     ]
@@ -634,22 +686,17 @@ def build_bottom_line_container(df_filtered):
     ])
 
 
-def build_bar_tab(df_filtered, active_severity):
+@lru_cache(maxsize=None)
+def build_bar_tab(active_severity):
     """
         Constructs the layout for the second page in our Dash app.
         This layout includes a top container for filter selection, a horizontal bar chart,
         and a bottom container for line chart analysis.
 
         Parameters:
-        - df_filtered: DataFrame with filtered data based on user selections.
         - active_severity: The active severity level.
         """
 
-    # Filter the DataFrame based on the active severity
-    if active_severity:
-        df_filtered = df_filtered[df_filtered['accident_severity'] == active_severity]
-    else:
-        df_filtered = df_filtered
     return html.Div(
         style={
             'display': 'flex',
@@ -681,7 +728,8 @@ def build_bar_tab(df_filtered, active_severity):
                                     # Horizontal bar chart visualization
                                     dcc.Graph(
                                         id='hbar-chart',
-                                        figure=hbar.update(df_filtered, None, None),
+                                        figure=build_chart_figure(hbar.select_attribute(None, None),
+                                                                  active_severity, None, None),
                                         style={'height': '100%'}
                                     ),
                                 ]
@@ -691,7 +739,7 @@ def build_bar_tab(df_filtered, active_severity):
                                 style={'display': 'flex', 'flexDirection': 'row', 'flex': '1',
                                        'alignItems': 'flex-start'},
                                 children=[
-                                    build_bottom_line_container(df_filtered)
+                                    build_bottom_line_container()
                                 ]
                             ),
                         ]
@@ -740,12 +788,7 @@ def build_left_container_heatmap():
                                           'margin-right': '100px'}),
                             dcc.Dropdown(
                                 id='correlation1',
-                                options=[{'label': corr1, 'value': corr1} for corr1 in ['First Point of Impact',
-                                                                                        'Pedestrian Movement',
-                                                                                        'Junction Location',
-                                                                                        'Junction Control',
-                                                                                        'Casualty Class',
-                                                                                        'Vehicle Manoeuvre']],
+                                options=[{'label': corr1, 'value': corr1} for corr1 in heatmap_labels],
                                 placeholder="Select an attribute",
                                 style={'width': '200px', 'color': elegant_colors['text'],
                                        'background': elegant_colors['background'],
@@ -760,12 +803,7 @@ def build_left_container_heatmap():
                                           'margin-right': '100px'}),
                             dcc.Dropdown(
                                 id='correlation2',
-                                options=[{'label': corr2, 'value': corr2} for corr2 in ['First Point of Impact',
-                                                                                        'Pedestrian Movement',
-                                                                                        'Junction Location',
-                                                                                        'Junction Control',
-                                                                                        'Casualty Class',
-                                                                                        'Vehicle Manoeuvre']],
+                                options=[{'label': corr2, 'value': corr2} for corr2 in heatmap_labels],
                                 placeholder="Select an attribute",
                                 style={'width': '200px', 'color': elegant_colors['text'],
                                        'background': elegant_colors['background'],
@@ -797,8 +835,40 @@ def build_left_container_heatmap():
                                     value='all',
                                     labelStyle={'display': 'inline-block', 'margin-right': '10px'},
                                     style={'textAlign': 'center', 'color': elegant_colors['text']}
+                                ),
+                                html.P("Colors Show:",
+                                       style={'textAlign': 'center', 'color': elegant_colors['text'],
+                                              'marginLeft': '10px', 'marginTop': '10px'}),
+                                # Counts, or a measure of association computed from them (see data/association.py)
+                                dcc.RadioItems(
+                                    id='heatmap-measure',
+                                    options=[
+                                        {'label': 'Count', 'value': 'count'},
+                                        {'label': 'Residual', 'value': 'residual'},
+                                        {'label': 'PMI', 'value': 'pmi'}
+                                    ],
+                                    value='count',
+                                    labelStyle={'display': 'inline-block', 'margin-right': '10px'},
+                                    style={'textAlign': 'center', 'color': elegant_colors['text']}
                                 )
                             ]
+                        ),
+
+                        # Strongest associations between the attributes, filled in by update_association_ranking
+                        html.Div(
+                            style={
+                                'backgroundColor': elegant_colors['background'],
+                                'padding': '10px',
+                                'borderRadius': '5px',
+                                'width': '80%',
+                                'box-shadow': 'rgba(100, 100, 111, 0.2) 0px 7px 29px 0px',
+                                'marginTop': '30px',
+                            },
+                            children=[
+                                html.P("Strongest Associations (Cramér's V):",
+                                       style={'textAlign': 'center', 'color': elegant_colors['text']}),
+                                html.Div(id='association-ranking', style={'fontSize': '12px'})
+                            ]
                         )
                     ], style={'display': 'flex', 'flex-direction': 'column', 'align-items': 'center'})
                 ]
@@ -807,6 +877,7 @@ def build_left_container_heatmap():
     )
 
 
+@lru_cache(maxsize=None)
 def build_heat_tab():
     """
         Constructs the layout for the heatmap tab (third page) in our Dash app.
@@ -861,7 +932,7 @@ def build_heat_tab():
                             dcc.Graph(
                                 id='heatmap-graph',
                                 # Function call to update the heatmap with initial data
-                                figure=heatmap.update(data=df, corr1=None, corr2=None),
+                                figure=build_heatmap_figure(heatmap.default_x, heatmap.default_y, False),
                                 style={
                                     'height': '100%',
                                     'width': '100%',
@@ -894,11 +965,6 @@ def select_dataframe(data, include_missing, selected_column):
     if include_missing:
         return filtered_df
     else:
-        # List of possible representations of missing values
-        missing_values = ['Unknown', 'Not known', 'Other/Not known', 'Other', 'Undefined',
-                          'Data missing or out of range', 'Data missing', 'Unclassified', 'Unallocated',
-                          'unknown (self reported)', 'Unknown vehicle type (self rep only)', 'Other vehicle', -1, -1.0,
-                          'Unknown (self reported)', 'Unknown or other']
         # Filter out rows with missing values in the selected column
         filtered_df = filtered_df[~filtered_df[selected_column].isin(missing_values)]
 
@@ -1026,88 +1092,35 @@ def road_attribute_masking(selected_attribute):
 
 def accident_severity_masking(selected_severity):
     """
-       Filters the dataset based on the selected accident severity.
+       Builds the row mask of the dataset for the selected accident severity.
 
        Parameters:
        - selected_severity: The name of the accident severity.
 
        Returns:
-       - filtered_df: DataFrame filtered by the selected accident severity.
+       - mask: Boolean row mask over df for the selected accident severity.
        """
-    filtered_df = df.copy()
-    if selected_severity == 'Slight':
-        filtered_df = filtered_df[filtered_df['accident_severity'] == 'Slight']
-    elif selected_severity == 'Serious':
-        filtered_df = filtered_df[filtered_df['accident_severity'] == 'Serious']
-    elif selected_severity == 'Fatal':
-        filtered_df = filtered_df[filtered_df['accident_severity'] == 'Fatal']
-    return filtered_df
+    if selected_severity in ('Slight', 'Serious', 'Fatal'):
+        return filter_index.mask({'accident_severity': selected_severity})
+    return filter_index.mask({})
 
 
-def treemap_masking(clickData, df):
+def treemap_masking(clickData):
     """
-    Filters the DataFrame based on the hierarchy path provided by the clickData from a treemap.
+    Translates the node clicked on the treemap into filter selections.
 
     Parameters:
     - clickData: The data from a click event on the treemap.
-    - df: The original DataFrame to be filtered.
 
     Returns:
-    - filtered_df: The DataFrame filtered based on the hierarchy path from clickData.
+    - selections: List of (column name, value) pairs that rows must all match, for filter_index.
     """
-    filtering_df = df.copy()
-    # Normalize data for matching conditions
-    filtering_df['light_conditions'] = filtering_df['light_conditions'].str.replace('-', '+')
-    filtering_df['speed_limit'] = filtering_df['speed_limit'].astype(str)
-
     # Check if clickData is valid
     if clickData is None or 'points' not in clickData or not clickData['points']:
-        return filtering_df
-
-    # Extract the path from clickData
-    path = clickData['points'][0]['id'].split(' - ')
-
-    if "All" in path:
-        return filtering_df
-
-    # Map for condition names to DataFrame column names
-    condition_map = {
-        "Weather Conditions": "weather_conditions",
-        "Road Conditions": "road_surface_conditions",
-        "Light Conditions": "light_conditions",
-        "Area Type": "urban_or_rural_area",
-        "Road Type": "road_type",
-        "Speed Limit": "speed_limit"
-    }
-
-    filtered_df = filtering_df
-
-    # Determine the initial key for filtering
-    if any(condition in path[0] for condition in
-           ["Fine no high winds", "Raining no high winds", "Snowing no high winds", "Fine + high winds",
-            "Raining + high winds", "Snowing + high winds", "Fog or mist", "Other", "Dry", "Wet or damp",
-            "Snow", "Frost or ice", "Flood over 3cm deep", "Oil or diesel", "Mud"]):
-        current_key = condition_map["Weather Conditions"]
-    elif any(condition in path[0] for condition in ["Urban", "Rural", "Roundabout", "One way street",
-                                                    "Dual carriageway", "Single carriageway",
-                                                    "Slip road", "One way street/Slip road", "Unknown", "20", "30",
-                                                    "40", "50", "60", "70"]):
-        current_key = condition_map["Area Type"]
-    else:
-        current_key = condition_map["Weather Conditions"]
-
-    # Apply filters based on the path
-    for part in path:
-        if part in condition_map:
-            current_key = condition_map[part]
-        elif current_key:
-            cleaned_part = part.strip()
-            if cleaned_part not in filtering_df[current_key].unique():
-                filtered_df = pd.DataFrame(columns=filtered_df.columns)  # Return empty DataFrame with same columns
-            else:
-                filtered_df = filtered_df[filtered_df[current_key] == cleaned_part]
+        return []
 
-    return filtered_df if not filtered_df.empty else pd.DataFrame(columns=df.columns)
+    # The selections of every node are known from the tree map, see treemap_hierarchy()
+    return list(treemap_selections.get(clickData['points'][0].get('id'), []))
 
 
 def heatmap_masking(correlation):
@@ -1171,28 +1184,28 @@ app.clientside_callback(
     Input("tabs", "active_tab")
 )
 def render_tab_content(active_tab):
-    filtered_df = df.copy()
     if active_tab == "tab-map":
         return build_map_tab()
     elif active_tab == "tab-barchart":
-        return build_bar_tab(filtered_df, None)
+        return build_bar_tab(None)
     elif active_tab == 'tab-heat-map':
         return build_heat_tab()
 
     return "No tab selected"
 
 
-# Callback for updating the map and total casualties based on user inputs
+# Callback for updating the map based on user inputs
 @app.callback(
-    [Output('map-graph', 'figure'),
-     Output('total-casualties', 'children')],
+    Output('map-graph', 'figure'),
     [Input('local-dropdown', 'value'),
      Input('severity-dropdown', 'value'),
      Input('month-range-slider', 'value'),
      Input('treemap-graph', 'clickData'),
-     Input('display-options', 'value')]
+     Input('display-options', 'value'),
+     Input('map-viewport', 'data')]
 )
-def update_map(selected_local_authority, selected_severity, month_range, selected_tree, display_option):
+def update_map(selected_local_authority, selected_severity, month_range, selected_tree, display_option,
+               viewport=None):
     """
        Updates the map based on user-selected filters such as local authority, severity, month range, and treemap selection.
 
@@ -1202,46 +1215,185 @@ def update_map(selected_local_authority, selected_severity, month_range, selecte
        - month_range: The selected range of months.
        - selected_tree: The data from a click event on the treemap.
        - display_option: The display option (e.g., 'aggregated').
+       - viewport: The visible area and zoom of the map (see update_viewport), or None for the initial view.
 
        Returns:
-       - A tuple containing the updated map figure and total casualties.
+       - The updated map figure.
        """
+    selections = map_selections(selected_local_authority, selected_severity, month_range, selected_tree)
+    # Single collisions are decimated to the visible area and grid cells are counted at its zoom, one point per local
+    # authority is always shown
+    bounds, level = None, None
+    if viewport and display_option != 'aggregated':
+        bounds = viewport['bounds']
+        if display_option == 'density' and viewport['zoom'] is not None:
+            level = map_grid.level(viewport['zoom'])
+    key = cache_key('map-figure', selected_local_authority, selections, display_option, bounds, level)
+    return figure_cache.cached(key, lambda: build_map_figure(selected_local_authority, selections, display_option,
+                                                             bounds, level))
+
+
+# Callback for the total casualties, separate from the map so it shows before the map figure is built
+@app.callback(
+    Output('total-casualties', 'children'),
+    [Input('local-dropdown', 'value'),
+     Input('severity-dropdown', 'value'),
+     Input('month-range-slider', 'value'),
+     Input('treemap-graph', 'clickData')]
+)
+def update_total(selected_local_authority, selected_severity, month_range, selected_tree):
+    """
+       Sums the casualties of the collisions matching the filters of the map tab.
+
+       Parameters:
+       - selected_local_authority: The selected local authority.
+       - selected_severity: The selected accident severity.
+       - month_range: The selected range of months.
+       - selected_tree: The data from a click event on the treemap.
+
+       Returns:
+       - The total casualties, over all selected collisions and not only the points shown.
+       """
+    # Answered from the prefix sums of the cube, see DataCube.total()
+    selections = map_selections(selected_local_authority, selected_severity, month_range, selected_tree)
+    return f"{map_cube.total(selections)}"
+
+
+def map_selections(selected_local_authority, selected_severity, month_range, selected_tree):
+    """
+       Combines the filters of the map tab into selections for the bitmap index and the cube.
+
+       Parameters:
+       - selected_local_authority: The selected local authority.
+       - selected_severity: The selected accident severity.
+       - month_range: The selected range of months.
+       - selected_tree: The data from a click event on the treemap.
 
-    filtered_df = df.copy()
-    # Filter by selected local authority
-    if selected_local_authority:
-        filtered_df = filtered_df[filtered_df['local_authority_ons_district'] == selected_local_authority]
-    # Filter by selected severity
-    if selected_severity:
-        filtered_df = filtered_df[filtered_df['accident_severity'] == selected_severity]
-    # Filter by selected month range
-    if month_range:
-        selected_months = [calendar.month_abbr[i] for i in range(month_range[0], month_range[1] + 1)]
-        filtered_df = filtered_df[df['month'].map(month_to_abbr).isin(selected_months)]
+       Returns:
+       - List of (column name, value) pairs the rows must match, see BitmapIndex.query().
+       """
+    # Combine the local authority, severity and month range selections into one row mask
+    selections = [('local_authority_ons_district', selected_local_authority),
+                  ('accident_severity', selected_severity),
+                  ('month', month_labels(month_range))]
     # Apply treemap masking if selected
     if selected_tree:
-        filtered_df = treemap_masking(selected_tree, filtered_df)
-    # Aggregate data if 'aggregated' option is selected
+        selections += treemap_masking(selected_tree)
+    return selections
+
+
+def build_map_figure(selected_local_authority, selections, display_option, viewport, level=None):
+    """
+       Builds the map figure for the given filter selections.
+
+       Parameters:
+       - selected_local_authority: The selected local authority, used to center the map.
+       - selections: List of (column name, value) pairs the rows must match, see BitmapIndex.query().
+       - display_option: The display option (e.g., 'aggregated').
+       - viewport: [west, south, east, north] of the visible area, or None for the whole map.
+       - level: The level of the grid in the 'density' display option, or None for the level of the initial zoom.
+
+       Returns:
+       - The map figure.
+       """
+    cells = None
+    # Aggregate data if 'aggregated' option is selected, by summing the cells of the cube
     if display_option == 'aggregated':
-        filtered_df = filtered_df.groupby('local_authority_ons_district').agg(
-            latitude=('latitude', 'mean'),
-            longitude=('longitude', 'mean'),
-            number_of_casualties=('number_of_casualties', 'sum'),
-            accident_severity=('accident_severity', lambda x: x.mode()[0])  # Most common severity
-        ).reset_index()
-    # Calculate total casualties
-    total_casualties = filtered_df['number_of_casualties'].sum() if not filtered_df.empty else 0
-    # Return updated map figure and total casualties
-    return (map.update(data=filtered_df, local_aut=selected_local_authority, display_option=display_option),
-            f"{total_casualties}")
+        filtered_df = map_cube.aggregate(selections)
+    elif display_option == 'density':
+        # Count the selected collisions per grid cell in view, at the level of the zoom. No row is materialized
+        filtered_df = None
+        if level is None:
+            level = map_grid.level(map.view(selected_local_authority)[2])
+        cells = map_grid.cells(filter_index.mask(selections), viewport, level, selection=cache_key(selections))
+    else:
+        mask = filter_index.mask(selections)
+        if viewport is None:
+            # Only the rows and columns used by the map are materialized
+            filtered_df = select(df, mask, map_columns)
+        else:
+            # Single collisions are only shown in view, so only the selected rows in view are materialized. They
+            # are found through the spatial index instead of a scan of the coordinates
+            filtered_df = select(df, mask & spatial_index.box_mask(viewport), map_columns)
+    # Return updated map figure
+    return map.update(data=filtered_df, local_aut=selected_local_authority, display_option=display_option,
+                      bounds=viewport, max_points=MAX_MAP_POINTS, cells=cells)
+
+
+# Callback for counting the collisions near the point clicked on the map
+@app.callback(
+    [Output('nearby-collisions', 'children'),
+     Output('nearby-collisions', 'style')],
+    [Input('map-graph', 'clickData'),
+     Input('local-dropdown', 'value'),
+     Input('severity-dropdown', 'value'),
+     Input('month-range-slider', 'value'),
+     Input('treemap-graph', 'clickData')]
+)
+def update_nearby(click_data, selected_local_authority, selected_severity, month_range, selected_tree):
+    """
+       Counts the selected collisions and their casualties within a distance of the point clicked on the map.
+
+       Parameters:
+       - click_data: The data from a click event on the map.
+       - selected_local_authority: The selected local authority.
+       - selected_severity: The selected accident severity.
+       - month_range: The selected range of months.
+       - selected_tree: The data from a click event on the treemap.
+
+       Returns:
+       - A tuple containing the text and the style of the nearby collisions box, which is hidden until a point
+         (a collision or a local authority) is clicked.
+       """
+    points = (click_data or {}).get('points') or [{}]
+    if 'lat' not in points[0] or 'lon' not in points[0]:
+        return '', {'display': 'none'}
+
+    # Collisions within the radius are found through the spatial index, then matched against the filters
+    rows, _ = spatial_index.radius(points[0]['lat'], points[0]['lon'], nearby_radius_km)
+    rows = rows[filter_index.mask(map_selections(selected_local_authority, selected_severity, month_range,
+                                                 selected_tree))[rows]]
+    casualties = df['number_of_casualties'].to_numpy()[rows].sum()
+    return (f"{len(rows)} collisions and {casualties} casualties within {nearby_radius_km} km of the clicked point",
+            nearby_style)
+
+
+# Callback for tracking the visible area of the map
+@app.callback(
+    Output('map-viewport', 'data'),
+    [Input('map-graph', 'relayoutData'),
+     Input('local-dropdown', 'value')]
+)
+def update_viewport(relayout_data, selected_local_authority):
+    """
+       Keeps the visible area of the map after the user pans or zooms it.
+
+       Parameters:
+       - relayout_data: The relayoutData of the map.
+       - selected_local_authority: The selected local authority.
+
+       Returns:
+       - Dictionary of the bounds ([west, south, east, north]) and the zoom of the visible area, or None for
+         the initial view.
+       """
+    # Selecting a local authority recenters the map, so the previous view no longer applies
+    if 'local-dropdown.value' in callback_context.triggered_prop_ids:
+        return None
+    bounds = viewport_bounds(relayout_data)
+    # Relayouts without bounds (e.g. resizing) keep the current view
+    if bounds is None:
+        return dash.no_update
+    return {'bounds': bounds, 'zoom': viewport_zoom(relayout_data)}
 
 
 # Callback for updating the line chart based on dropdown activity
 @app.callback(
     Output('line-chart', 'figure'),  # Assume you have this in your layout for debugging
-    [Input('line-x-dropdown', 'value')]
+    [Input('line-x-dropdown', 'value'),
+     Input('accident-severity-dropdown', 'value'),
+     Input('local-authority-dropdown', 'value')]
 )
-def line_update(selected_attribute):
+def line_update(selected_attribute, selected_severity=None, selected_ons=None):
     """
         Updates the line chart based on selected attributes, severity, and local authority.
 
@@ -1253,10 +1405,9 @@ def line_update(selected_attribute):
         Returns:
         - The updated line chart figure.
         """
-    filtered_df = df.copy()
     s_attr = None
     if selected_attribute == 'Time of the Day':
-        s_attr = 'time'
+        s_attr = 'hour'
     elif selected_attribute == 'Day of the Week':
         s_attr = 'day_of_week'
     elif selected_attribute == 'Month of the Year':
@@ -1265,7 +1416,27 @@ def line_update(selected_attribute):
         s_attr = 'age_band_of_driver'
     elif selected_attribute == 'Speed Limit':
         s_attr = 'speed_limit'
-    return line.update(filtered_df, s_attr)
+    key = cache_key('line', s_attr, selected_severity, selected_ons)
+    return figure_cache.cached(key, lambda: build_line_figure(s_attr, selected_severity, selected_ons))
+
+
+def build_line_figure(s_attr, selected_severity=None, selected_ons=None):
+    """
+        Builds the line chart of casualties over an attribute.
+
+        Parameters:
+        - s_attr: The column on the x-axis, or None for the hour of the day.
+        - selected_severity: The selected accident severity.
+        - selected_ons: The selected local authority.
+
+        Returns:
+        - The line chart figure.
+        """
+    # Casualties are counted at the grain of the attribute, e.g. per vehicle for the age band of the driver. Without
+    # filters every row is kept and the columns of the tables are read as they are
+    mask = bar_tab_mask(selected_severity, selected_ons)
+    columns = [s_attr or 'hour', 'accident_severity', 'number_of_casualties']
+    return line.update(tables.frame(columns, None if mask.all() else mask), s_attr)
 
 
 # Callback for updating the barchart based on dropdown inputs
@@ -1301,15 +1472,6 @@ def update_chart(selected_vtype, selected_ctype, selected_rtype, selected_severi
     ctx = callback_context
     # Get the IDs of the inputs that triggered the callback
     trigger_ids = list(ctx.triggered_prop_ids.keys())
-    # Filter by accident severity if selected
-    filtered_df = df.copy()
-    if selected_severity:
-        filtered_df = accident_severity_masking(selected_severity)
-
-    # Filter by local authority if selected
-    if selected_ons:
-        filtered_df = filtered_df[filtered_df['local_authority_ons_district'] == selected_ons]
-
     vehicle_value, casualty_value, road_value = None, None, None
     selected_attribute, selected_type = None, None
 
@@ -1329,16 +1491,62 @@ def update_chart(selected_vtype, selected_ctype, selected_rtype, selected_severi
     casualty_value = casualty_value if selected_type == 'casualty' else None
     road_value = road_value if selected_type == 'road' else None
 
+    # Resolve the attribute the chart will show, it stays the same when a filter triggered the callback
+    chart_attribute = hbar.select_attribute(selected_attribute, selected_type)
+    key = cache_key('hbar', chart_attribute, selected_severity, selected_ons, selected_dataframe)
+    chart_figure = figure_cache.cached(key, lambda: build_chart_figure(chart_attribute, selected_severity,
+                                                                       selected_dataframe, selected_ons))
+
+    return vehicle_value, casualty_value, road_value, chart_figure
+
+
+def bar_tab_mask(selected_severity, selected_ons):
+    """
+       Builds the row mask of the collisions for the severity and local authority filters of the bar chart tab,
+       which apply to both the bar and the line chart.
+
+       Parameters:
+       - selected_severity: The selected accident severity.
+       - selected_ons: The selected local authority.
+
+       Returns:
+       - Boolean row mask over df.
+       """
+    # Filter by accident severity if selected
+    mask = accident_severity_masking(selected_severity)
+
+    # Filter by local authority if selected
+    if selected_ons:
+        mask &= filter_index.mask({'local_authority_ons_district': selected_ons})
+    return mask
+
+
+def build_chart_figure(chart_attribute, selected_severity, selected_dataframe, selected_ons):
+    """
+       Builds the horizontal bar chart figure for the given attribute and filters.
+
+       Parameters:
+       - chart_attribute: The column the chart shows, see HorizontalBarChart.select_attribute().
+       - selected_severity: The selected accident severity.
+       - selected_dataframe: The selected data option (e.g., 'all', 'excluded').
+       - selected_ons: The selected local authority.
+
+       Returns:
+       - The horizontal bar chart figure.
+       """
+    mask = bar_tab_mask(selected_severity, selected_ons)
+
+    # One row per vehicle, casualty or collision, depending on the table of the attribute
+    filtered_df = tables.frame([chart_attribute, 'accident_severity'], mask)
+
     # Filter DataFrame based on data option
     if selected_dataframe == 'excluded':
-        filtered_df = select_dataframe(filtered_df, include_missing=False, selected_column=selected_attribute)
+        filtered_df = select_dataframe(filtered_df, include_missing=False, selected_column=chart_attribute)
     elif selected_dataframe == 'all':
-        filtered_df = select_dataframe(filtered_df, include_missing=True, selected_column=selected_attribute)
-
-    # Update the chart figure
-    chart_figure = hbar.update(filtered_df, selected_attribute, selected_type)
+        filtered_df = select_dataframe(filtered_df, include_missing=True, selected_column=chart_attribute)
 
-    return vehicle_value, casualty_value, road_value, chart_figure
+    # Update the chart figure, the attribute has already been selected
+    return hbar.update(filtered_df, None, None, grain=tables.grain([chart_attribute, 'accident_severity']))
 
 
 # Callback for updating the heatmap based on dropdown inputs
@@ -1346,9 +1554,10 @@ def update_chart(selected_vtype, selected_ctype, selected_rtype, selected_severi
     Output('heatmap-graph', 'figure'),
     [Input('correlation1', 'value'),
      Input('correlation2', 'value'),
-     Input('data-heatmap-options', 'value')]
+     Input('data-heatmap-options', 'value'),
+     Input('heatmap-measure', 'value')]
 )
-def update_heatmap(corr1, corr2, selected_dataframe):
+def update_heatmap(corr1, corr2, selected_dataframe, measure='count'):
     """
         Updates the heatmap based on selected correlation attributes and data options.
 
@@ -1356,22 +1565,77 @@ def update_heatmap(corr1, corr2, selected_dataframe):
         - corr1: The first correlation attribute.
         - corr2: The second correlation attribute.
         - selected_dataframe: The selected data option (e.g., 'all', 'excluded').
+        - measure: What the colors show, 'count', 'residual' or 'pmi'.
 
         Returns:
         - The updated heatmap figure.
         """
 
-    filtered_df = df.copy()
     # Map correlation attributes to corresponding dataset columns
-    corr1 = heatmap_masking(corr1)
-    corr2 = heatmap_masking(corr2)
-    # Filter DataFrame based on data option
-    if selected_dataframe == 'excluded':
-        filtered_df = select_dataframe(filtered_df, include_missing=False, selected_column=corr1)
-        filtered_df = select_dataframe(filtered_df, include_missing=False, selected_column=corr2)
-    elif selected_dataframe == 'all':
-        filtered_df = df.copy()
-    return heatmap.update(data=filtered_df, corr1=corr1, corr2=corr2)
+    corr1 = heatmap_masking(corr1) or heatmap.default_x
+    corr2 = heatmap_masking(corr2) or heatmap.default_y
+    excluded = selected_dataframe == 'excluded'
+    measure = measure or 'count'
+    return figure_cache.cached(cache_key('heatmap', corr1, corr2, excluded, measure),
+                               lambda: build_heatmap_figure(corr1, corr2, excluded, measure))
+
+
+def build_heatmap_figure(corr1, corr2, excluded, measure='count'):
+    """
+        Builds the heatmap figure for two dataset columns.
+
+        Parameters:
+        - corr1: The column on the x-axis.
+        - corr2: The column on the y-axis.
+        - excluded: Whether rows with missing values in either column are left out.
+        - measure: What the colors show, 'count', 'residual' or 'pmi'.
+
+        Returns:
+        - The heatmap figure.
+        """
+    # The counts were taken at the finest grain of the two columns when the dataset was built. Excluding the
+    # missing values drops their rows and columns from the counts
+    counts, x_labels, y_labels = heatmap_pairs.matrix(corr1, corr2, drop=missing_values if excluded else ())
+    return heatmap.draw(counts, x_labels, y_labels, corr1, corr2, measure, grain=tables.grain([corr1, corr2]))
+
+
+@lru_cache(maxsize=None)
+def association_ranking(excluded):
+    """
+        Ranks the pairs of heatmap attributes by association, once per process and data option. The ranking only
+        reads the precomputed pair counts, so it takes a few milliseconds.
+
+        Parameters:
+        - excluded: Whether the missing-value labels are left out.
+
+        Returns:
+        - DataFrame of the pairs from the strongest association to the weakest, see rank_associations().
+        """
+    return rank_associations(heatmap_pairs, drop=missing_values if excluded else ())
+
+
+# Callback for the ranking of the attribute pairs by association
+@app.callback(
+    Output('association-ranking', 'children'),
+    [Input('data-heatmap-options', 'value')]
+)
+def update_association_ranking(selected_dataframe):
+    """
+        Lists the pairs of heatmap attributes from the strongest association to the weakest.
+
+        Parameters:
+        - selected_dataframe: The selected data option (e.g., 'all', 'excluded').
+
+        Returns:
+        - A table of the pairs and their Cramér's V.
+        """
+    ranking = association_ranking(selected_dataframe == 'excluded')
+
+    names = {heatmap_masking(label): label for label in heatmap_labels}
+    return html.Table([
+        html.Tr([html.Td(f"{names[row.x]} / {names[row.y]}"), html.Td(f"{row.cramers_v:.2f}")])
+        for row in ranking.itertuples()
+    ], style={'width': '100%', 'color': elegant_colors['text']})
 
 
 # This function gets inputs and decides open or close for the pop-up based clicks.
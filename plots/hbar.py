@@ -1,6 +1,8 @@
 from dash import dcc, html
 import plotly.graph_objects as go
 
+from data.tables import GRAIN_LABELS
+
 
 class HorizontalBarChart(html.Div):
     """
@@ -8,16 +10,15 @@ class HorizontalBarChart(html.Div):
 
     """
 
-    def __init__(self, html_id, data):
+    def __init__(self, html_id):
         """
-        Initializes the HorizontalBarChart with the specified HTML ID and data.
+        Initializes the HorizontalBarChart with the specified HTML ID. The data comes with every update().
 
         Parameters:
         - html_id: The ID for the HTML component.
-        - data: The data to be used in the chart.
         """
         self.html_id = html_id
-        self.data = data
+        self.data = None
         self.vehicle_attr = None
         self.casualty_attr = None
         self.road_attr = None
@@ -27,20 +28,18 @@ class HorizontalBarChart(html.Div):
             ]
         )
 
-    def update(self, data, attribute, attribute_type):
+    def select_attribute(self, attribute, attribute_type):
         """
-        Updates the chart based on the provided data and selected attribute.
+        Resolves the attribute shown by the chart. Selecting an attribute from one dropdown resets the others,
+        and without a new selection the previously selected attribute is kept.
 
         Parameters:
-        - data: The data to be used for updating the chart.
         - attribute: The selected attribute to group the data by.
         - attribute_type: The type of the selected attribute ('vehicle', 'collision', 'road').
 
         Returns:
-        - A Plotly object. (stacked bar chart)
+        - The column name of the attribute to show.
         """
-        self.data = data
-
         # Reset the attributes based on which dropdown is selected
         if attribute_type == 'vehicle':
             self.vehicle_attr = attribute
@@ -56,10 +55,29 @@ class HorizontalBarChart(html.Div):
             self.casualty_attr = None
 
         # Determine the selected attribute
-        selected_attribute = self.vehicle_attr or self.casualty_attr or self.road_attr or 'vehicle_type'
+        return self.vehicle_attr or self.casualty_attr or self.road_attr or 'vehicle_type'
+
+    def update(self, data, attribute, attribute_type, grain='collision'):
+        """
+        Updates the chart based on the provided data and selected attribute.
+
+        Parameters:
+        - data: The data to be used for updating the chart.
+        - attribute: The selected attribute to group the data by.
+        - attribute_type: The type of the selected attribute ('vehicle', 'collision', 'road').
+        - grain: The table one row of data stands for ('collision', 'vehicle' or 'casualty'), see
+          CollisionTables.grain().
+
+        Returns:
+        - A Plotly object. (stacked bar chart)
+        """
+        self.data = data
+        selected_attribute = self.select_attribute(attribute, attribute_type)
+        counted = GRAIN_LABELS[grain]
 
         # Group and process the data
-        grouped_data = self.data.groupby([selected_attribute, 'accident_severity']).size().reset_index(name='count')
+        grouped_data = self.data.groupby([selected_attribute, 'accident_severity'], observed=True).size()
+        grouped_data = grouped_data.reset_index(name='count')
         grouped_data = grouped_data.sort_values(by='count', ascending=True)
         total_accidents = grouped_data['count'].sum()  # Calculate the total number of accidents
 
@@ -85,14 +103,14 @@ class HorizontalBarChart(html.Div):
             textposition='inside',
             hovertemplate=
             '<b>%{y}</b><br>' +
-            'Percentage of Total Accidents: %{customdata}<extra></extra>',
+            f'Percentage of Total {counted}: %{{customdata}}<extra></extra>',
             customdata=grouped_data['percentage'],  # Use custom data for hover template
             marker_color=grouped_data['color']  # Apply colors based on severity
         ))
 
         # Customize the layout
         self.fig.update_layout(
-            xaxis_title='Number of Accidents',
+            xaxis_title=f'Number of {counted}',
             yaxis_title=selected_attribute.replace('_', ' ').title(),
             paper_bgcolor='rgba(0,0,0,0)',
             plot_bgcolor='rgba(0,0,0,0)',
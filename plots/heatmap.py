@@ -1,72 +1,93 @@
-import pandas as pd
 from dash import dcc, html
 import plotly.graph_objects as go
 
+from data.aggregate import contingency
+from data.association import association, cramers_v
+from data.tables import GRAIN_LABELS
+
 
 class HeatMap(html.Div):
     """
     A class to create a heatmap component in our Dash app.
 
     """
+    # Attributes shown when none is selected
+    default_x = 'junction_location'
+    default_y = 'junction_control'
+    # Title of the color bar of every measure, see data/association.py. The counts are titled by what they count
+    measure_titles = {'residual': 'Standardized Residual', 'pmi': 'Pointwise Mutual Information (bits)'}
 
-    def __init__(self, html_id, data):
+    def __init__(self, html_id):
         """
-        Initializes the HeatMap with the specified HTML ID and data.
+        Initializes the HeatMap with the specified HTML ID. The data comes with every update().
 
         Parameters:
         - html_id: The ID for the HTML component.
-        - data: The data to be used in the heatmap.
         """
         self.html_id = html_id
-        self.data = data
         super().__init__(
             children=[
                 dcc.Graph(id=self.html_id)  # Create a Graph component with the specified HTML ID
             ]
         )
 
-    def update(self, data, corr1, corr2):
+    def update(self, data, corr1, corr2, grain='collision'):
         """
         Updates the heatmap based on the provided data and selected correlation attributes.
 
         Parameters:
-        - data: The data to be used for updating the heatmap.
+        - data: The data to be used for updating the heatmap, it is only read.
         - corr1: The selected attribute for the x-axis.
         - corr2: The selected attribute for the y-axis.
+        - grain: The table one row of data stands for, see CollisionTables.grain().
 
         Returns:
         - A Plotly figure. (heatmap)
         """
         if corr1 is None:
-            corr1 = 'junction_location'
+            corr1 = self.default_x
         if corr2 is None:
-            corr2 = 'junction_control'
+            corr2 = self.default_y
+
+        # Count the rows of every pair of labels, as the matrix the heatmap draws
+        counts, x_labels, y_labels = contingency(data[corr1], data[corr2])
+        return self.draw(counts, x_labels, y_labels, corr1, corr2, grain=grain)
 
-        # Calculate the frequency of accidents for the heatmap
-        heatmap_data = data.groupby([corr1, corr2]).size().reset_index(name='number_of_casualties')
+    def draw(self, counts, x_labels, y_labels, corr1, corr2, measure='count', grain='collision'):
+        """
+        Draws a matrix of counts, e.g. one looked up in the precomputed PairCounts of data/pairs.py.
 
-        # Create a complete matrix of all possible combinations of corr1 and corr2
-        unique_corr1 = data[corr1].unique()
-        unique_corr2 = data[corr2].unique()
-        complete_index = pd.MultiIndex.from_product([unique_corr1, unique_corr2], names=[corr1, corr2])
+        Parameters:
+        - counts: Array of shape (number of y labels, number of x labels).
+        - x_labels, y_labels: The labels of the columns and rows of counts.
+        - corr1: The attribute on the x-axis.
+        - corr2: The attribute on the y-axis.
+        - measure: What the colors show, the counts or a measure of association computed from them ('residual'
+          or 'pmi', see data/association.py). The cells always show the counts.
+        - grain: The table the counts count the rows of ('collision', 'vehicle' or 'casualty').
 
-        # Reindex the heatmap_data to fill missing values with zeroes
-        heatmap_data = heatmap_data.set_index([corr1, corr2]).reindex(complete_index, fill_value=0).reset_index()
+        Returns:
+        - A Plotly figure. (heatmap)
+        """
+        z = association(counts, measure)
+        # Measures of association are signed, so they get a diverging scale centered on independence
+        scale = dict(colorscale='Viridis') if measure == 'count' else dict(colorscale='RdBu', reversescale=True, zmid=0)
 
         # Create the heatmap figure
         fig = go.Figure(data=go.Heatmap(
-            z=heatmap_data['number_of_casualties'],
-            x=heatmap_data[corr1],
-            y=heatmap_data[corr2],
-            text=heatmap_data['number_of_casualties'],
+            z=z,
+            x=list(x_labels),
+            y=list(y_labels),
+            text=counts,
             texttemplate="%{text}",
             textfont={"size": 10},
-            colorscale='Viridis',
-            colorbar=dict(title='Accident Count')
+            colorbar=dict(title=self.measure_titles.get(measure, f'Number of {GRAIN_LABELS[grain]}')),
+            **scale
         ))
 
         # Customize the layout
         fig.update_layout(
+            title=f"Cramér's V: {cramers_v(counts):.2f}",
             xaxis_title=corr1,
             yaxis_title=corr2,
             paper_bgcolor='rgba(0,0,0,0)',
@@ -1,6 +1,8 @@
 from dash import dcc, html
 import plotly.graph_objects as go
-import pandas as pd
+import numpy as np
+
+from data.schema import codes_of
 
 
 class LineChart(html.Div):
@@ -8,16 +10,14 @@ class LineChart(html.Div):
     A class to create a line chart component in our Dash app.
     """
 
-    def __init__(self, html_id, data):
+    def __init__(self, html_id):
         """
-        Initializes the LineChart with the specified HTML ID and data.
+        Initializes the LineChart with the specified HTML ID. The data comes with every update().
 
         Parameters:
         - html_id: The ID for the HTML component.
-        - data: The data to be used in the line chart.
         """
         self.html_id = html_id
-        self.data = data
         super().__init__(
             children=[
                 dcc.Graph(id=self.html_id)  # Create a Graph component with the specified HTML ID
@@ -28,32 +28,40 @@ class LineChart(html.Div):
         """
         Updates the line chart based on the provided data and selected x-axis attribute.
 
+        The data is only read: the casualties are summed per severity and x value with one bincount over the
+        integer codes of the columns, so no column is converted or copied.
+
         Parameters:
-        - data: The data to be used for updating the line chart.
-        - x_attr: The selected attribute for the x-axis (default is 'time').
+        - data: The data to be used for updating the line chart, with the x-axis column, accident_severity and
+          number_of_casualties. Label columns are Categoricals in the order of data/schema.py and the hour is the
+          integer hour of the day (see add_date_columns in data/loader.py).
+        - x_attr: The selected attribute for the x-axis (default is 'hour').
 
         Returns:
         - A Plotly figure object. (line chart)
         """
         if x_attr is None:
-            x_attr = 'time'  # Default x-axis attribute
-        if x_attr == 'time':
-            # Ensure datetime format for plotting
-            data[x_attr] = pd.to_datetime(data[x_attr], dayfirst=True)
-            data['hour'] = data[x_attr].dt.strftime('%H:00')
-            x_attr = 'hour'  # Change the x_attr to 'hour' for plotting
-        elif x_attr == 'age_band_of_driver':
-            # Define the categorical order for age_band_of_driver
-            age_band_order = [
-                '0 - 5', '6 - 10', '11 - 15', '16 - 20', '21 - 25',
-                '26 - 35', '36 - 45', '46 - 55', '56 - 65', '66 - 75', 'Over 75'
-            ]
-            data[x_attr] = pd.Categorical(data[x_attr], categories=age_band_order, ordered=True)
-        elif x_attr == 'month':
-            # Define the categorical order for months
-            month_order = ('January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
-                           'October', 'November', 'December')
-            data[x_attr] = pd.Categorical(data[x_attr], categories=month_order, ordered=True)
+            x_attr = 'hour'  # Default x-axis attribute
+        values = data[x_attr]
+        if x_attr == 'hour':
+            labels = [f'{hour:02}:00' for hour in range(24)]
+            codes = values.to_numpy()
+        else:
+            codes, labels = codes_of(values)
+            labels = list(labels)
+        if x_attr == 'age_band_of_driver' and 'Data missing or out of range' in labels:
+            # Drivers without a known age band are not shown
+            codes = np.where(codes == labels.index('Data missing or out of range'), -1, codes)
+
+        severity_codes, severities = codes_of(data['accident_severity'])
+
+        # Rows and casualties per (severity, x value), combinations without rows are not drawn
+        keep = (codes >= 0) & (severity_codes >= 0)
+        key = severity_codes[keep].astype(np.int64) * len(labels) + codes[keep]
+        size = len(severities) * len(labels)
+        rows = np.bincount(key, minlength=size).reshape(len(severities), len(labels))
+        casualties = np.bincount(key, weights=data['number_of_casualties'].to_numpy(dtype=float)[keep],
+                                 minlength=size).reshape(len(severities), len(labels))
 
         # Define color map for accident severity
         severity_colors = {
@@ -79,23 +87,16 @@ class LineChart(html.Div):
         self.fig = go.Figure()
 
         # Plot each severity level separately
-        for severity in data['accident_severity'].unique():
-            filtered_data = data[data['accident_severity'] == severity]
-
-            if x_attr == 'hour':
-                # Group by hour for datetime data
-                grouped_data = filtered_data.groupby(x_attr)['number_of_casualties'].sum().reset_index()
-                x_values = grouped_data[x_attr]
-            else:
-                # Group by x_attr for non-datetime data
-                grouped_data = filtered_data.groupby(x_attr)['number_of_casualties'].sum().reset_index()
-                x_values = grouped_data[x_attr]
+        for code, severity in enumerate(severities):
+            observed = np.flatnonzero(rows[code])
+            if not len(observed):
+                continue
 
             # Add trace to the figure
             self.fig.add_trace(
                 go.Scatter(
-                    x=x_values,
-                    y=grouped_data['number_of_casualties'],
+                    x=[labels[i] for i in observed],
+                    y=casualties[code, observed].round().astype(np.int64),
                     mode='lines',
                     name=f'{severity} Accidents',
                     line=dict(color=severity_colors[severity]),
@@ -1,7 +1,10 @@
 from dash import dcc, html
 import plotly.express as px
+import numpy as np
 import pandas as pd
 
+from data.viewport import decimate
+
 
 class MapBox(html.Div):
     """
@@ -9,53 +12,57 @@ class MapBox(html.Div):
 
     """
 
-    def __init__(self, html_id, data):
+    def __init__(self, html_id, views=None):
         """
-        Initializes the Scatter Map with the specified HTML ID and data.
+        Initializes the Scatter Map with the specified HTML ID. No figure is built until update() is called.
 
         Parameters:
         - html_id: The ID for the HTML component.
-        - data: The data to be used in the MapBox.
+        - views: The initial view of every local authority (see authority_viewports), or None to always start
+          from the view of the whole country.
         """
         self.html_id = html_id
-        self.data = data
-        self._encode()
+        self.data = None
+        self.fig = None
+        # Initial view of every local authority, so selecting one does not scan its rows
+        self.views = views if views is not None else pd.DataFrame(columns=['latitude', 'longitude', 'zoom'])
         super().__init__(
             children=[
                 dcc.Graph(id=self.html_id)  # Create a Graph component with the specified HTML ID
             ]
         )
-        self.update(self.data, None, None)  # Initial update of the map with default options
 
-    def _encode(self):
+    def view(self, local_aut):
         """
-        Encodes the data for use in the map.
+        Looks up the initial center and zoom level of the map.
 
-        Converts date strings to datetime objects, extracts month names, and maps day of the week integers
-        to their corresponding names.
+        Parameters:
+        - local_aut: The selected local authority, or None for the whole country.
+
+        Returns:
+        - A tuple of the center latitude, center longitude and zoom level.
         """
-        self.data['date'] = pd.to_datetime(self.data['date'], dayfirst=True)
-        self.data['month'] = self.data['date'].dt.strftime('%B')
-
-        day_mapping = {
-            1: 'Sunday',
-            2: 'Monday',
-            3: 'Tuesday',
-            4: 'Wednesday',
-            5: 'Thursday',
-            6: 'Friday',
-            7: 'Saturday'
-        }
-        self.data['day_of_week'] = self.data['day_of_week'].replace(day_mapping)
+        if local_aut is None or local_aut not in self.views.index:
+            # Set default center and zoom level if no local authority (with located collisions) is selected
+            return 55.09621, -4.0286298, 4.6
+        view = self.views.loc[local_aut]
+        return float(view['latitude']), float(view['longitude']), float(view['zoom'])
 
-    def update(self, data, local_aut, display_option):
+    def update(self, data, local_aut, display_option, bounds=None, max_points=None, cells=None):
         """
         Updates the map based on the provided data, selected local authority, and display option.
 
         Parameters:
-        - data: The data to be used for updating the map.
+        - data: The data to be used for updating the map. For the 'aggregated' display option it already holds
+          one row per local authority (see DataCube.aggregate). None for the 'density' display option, which
+          only draws the cells.
         - local_aut: The selected local authority.
-        - display_option: The display option ('all' or 'aggregated').
+        - display_option: The display option ('all', 'aggregated' or 'density').
+        - bounds: [west, south, east, north] of the visible area, or None for the whole map.
+        - max_points: For the 'all' display option, the number of points to decimate the data to within the
+          bounds (see data/viewport.py), or None to show every point.
+        - cells: For the 'density' display option, the grid cells to draw instead of the rows of data
+          (see GridPyramid.cells).
 
         Returns:
         - A Plotly figure object. (Scatter Map)
@@ -75,30 +82,10 @@ class MapBox(html.Div):
         if display_option is None:
             display_option = 'all'
 
-        df = data.copy()
         max_size = 15
-
-        if local_aut is None:
-            # Set default center and zoom level if no local authority is selected
-            center_lat = 55.09621
-            center_long = -4.0286298
-            zoom_level = 4.6
-        else:
-            # Filter data for the selected local authority
-            df = data[data['local_authority_ons_district'] == local_aut]
-            center_lat = df['latitude'].median()
-            center_long = df['longitude'].median()
-            difference_lat = abs(df['latitude'].max() - df['latitude'].min())
-            zoom_level = 11 - difference_lat * 12 / 10
+        center_lat, center_long, zoom_level = self.view(local_aut)
 
         if display_option == 'aggregated':
-            # Aggregate data by local authority for the 'aggregated' display option
-            data = data.groupby('local_authority_ons_district').agg(
-                latitude=('latitude', 'mean'),
-                longitude=('longitude', 'mean'),
-                number_of_casualties=('number_of_casualties', 'sum'),
-                accident_severity=('accident_severity', lambda x: x.mode()[0])
-            ).reset_index()
             max_size = 30
             severity_colors = {
                 'Fatal': '#8B0000',
@@ -106,10 +93,15 @@ class MapBox(html.Div):
                 'Slight': '#FF9F00'
             }
         elif display_option == 'all':
-            # Use the filtered data for the 'all' display option
-            data = df.copy()
-
-        if self.data.empty:
+            # Use the filtered data for the 'all' display option, decimated to what the visible area can show
+            if local_aut is not None:
+                # Filter data for the selected local authority
+                data = data[data['local_authority_ons_district'] == local_aut]
+            if max_points is not None:
+                data = decimate(data, bounds, max_points)
+
+        # The density grid has no rows, it is empty when no selected collision is in view
+        if cells.empty if data is None else self.data.empty:
             # Handle case where data is empty
             self.fig = px.scatter_mapbox(lat=[], lon=[],
                                          size_max=max_size, zoom=zoom_level,
@@ -126,21 +118,21 @@ class MapBox(html.Div):
                     color="#383838",
                 ),
                 showlegend=False,
+                uirevision=str(local_aut),  # Keep the pan and zoom of the user until the local authority changes
             )
             return self.fig
         else:
-            # Ensure latitude and longitude are of float type
-            self.data["latitude"] = self.data["latitude"].astype(float)
-            self.data["longitude"] = self.data["longitude"].astype(float)
-
-            self.fig = px.scatter_mapbox(data, lat="latitude", lon="longitude",
-                                         color="accident_severity",
-                                         color_discrete_map=severity_colors,
-                                         size="number_of_casualties",
-                                         size_max=max_size,
-                                         zoom=zoom_level,
-                                         center={"lat": center_lat, "lon": center_long},
-                                         mapbox_style="carto-positron")
+            if display_option == 'density':
+                self.fig = self.density(cells, zoom_level, center_lat, center_long)
+            else:
+                self.fig = px.scatter_mapbox(data, lat="latitude", lon="longitude",
+                                             color="accident_severity",
+                                             color_discrete_map=severity_colors,
+                                             size="number_of_casualties",
+                                             size_max=max_size,
+                                             zoom=zoom_level,
+                                             center={"lat": center_lat, "lon": center_long},
+                                             mapbox_style="carto-positron")
 
             self.fig.update_layout(
                 margin={"r": 0, "t": 0, "l": 0, "b": 0},
@@ -153,6 +145,42 @@ class MapBox(html.Div):
                 ),
                 showlegend=False,
                 coloraxis_showscale=False,
+                uirevision=str(local_aut),  # Keep the pan and zoom of the user until the local authority changes
             )
 
             return self.fig
+
+    @staticmethod
+    def density(cells, zoom_level, center_lat, center_long):
+        """
+        Draws grid cells as squares colored by their number of collisions.
+
+        Parameters:
+        - cells: DataFrame of grid cells, see GridPyramid.cells.
+        - zoom_level: The zoom level of the map.
+        - center_lat, center_long: The center of the map.
+
+        Returns:
+        - A Plotly figure object. (Choropleth Map)
+        """
+        # Only the corners of the cells in view are sent, rounded to about a meter
+        corners = cells[['west', 'south', 'east', 'north']].round(5).to_numpy().tolist()
+        geojson = {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'id': i,
+             'geometry': {'type': 'Polygon', 'coordinates': [[[w, s], [e, s], [e, n], [w, n], [w, s]]]}}
+            for i, (w, s, e, n) in enumerate(corners)]}
+
+        fig = px.choropleth_mapbox(cells, geojson=geojson, locations=np.arange(len(cells)),
+                                   # Counts span several orders of magnitude between towns and the countryside
+                                   color=np.log10(cells['count'].clip(lower=1)),
+                                   color_continuous_scale=['#FF9F00', '#FF0000', '#8B0000'],
+                                   custom_data=['count', 'Fatal', 'Serious', 'Slight', 'number_of_casualties'],
+                                   opacity=0.6,
+                                   zoom=zoom_level,
+                                   center={"lat": center_lat, "lon": center_long},
+                                   mapbox_style="carto-positron")
+        fig.update_traces(marker_line_width=0,
+                          hovertemplate='Collisions: %{customdata[0]}<br>Fatal: %{customdata[1]}<br>'
+                                        'Serious: %{customdata[2]}<br>Slight: %{customdata[3]}<br>'
+                                        'Casualties: %{customdata[4]}<extra></extra>')
+        return fig
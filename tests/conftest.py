@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.schema import SEVERITIES, apply_schema
+from data.tables import split_tables
+
+
+def source_tables(collisions=300, seed=0):
+    """
+    Builds random collision, vehicle and casualty files in the layout of the DfT downloads. Some collisions have
+    no vehicle, some vehicles no casualty, and some casualties refer to a vehicle that is not in the data.
+    """
+    rng = np.random.default_rng(seed)
+    index = [f'2022{i:07d}' for i in range(collisions)]
+    collision = pd.DataFrame({
+        'accident_index': index, 'accident_year': 2022, 'accident_reference': np.arange(collisions),
+        'accident_severity': rng.choice(SEVERITIES, collisions),
+        'local_authority_ons_district': rng.choice(['E06000001', 'E06000002', 'E06000057', None], collisions),
+        'number_of_casualties': rng.integers(1, 4, collisions),
+    })
+
+    vehicles = rng.integers(0, 4, collisions)
+    vehicle = pd.DataFrame({
+        'accident_index': np.repeat(index, vehicles), 'accident_year': 2022,
+        'accident_reference': np.repeat(np.arange(collisions), vehicles),
+        'vehicle_reference': np.concatenate([np.arange(1, count + 1) for count in vehicles]),
+    })
+    vehicle['vehicle_type'] = rng.choice(['Car', 'Bus', 'Motorcycle'], len(vehicle))
+    vehicle['junction_location'] = rng.choice(['Mid junction', 'Approaching junction', 'Not at junction'],
+                                              len(vehicle))
+
+    casualties = rng.integers(0, 3, collisions)
+    casualty = pd.DataFrame({
+        'accident_index': np.repeat(index, casualties), 'accident_year': 2022,
+        'accident_reference': np.repeat(np.arange(collisions), casualties),
+        'vehicle_reference': rng.integers(1, 4, casualties.sum()),
+        'casualty_reference': np.concatenate([np.arange(1, count + 1) for count in casualties]),
+    })
+    casualty['casualty_class'] = rng.choice(['Driver or rider', 'Passenger', 'Pedestrian'], len(casualty))
+    return collision, vehicle, casualty
+
+
+def merge(collision, vehicle, casualty):
+    """
+    Merges the files the way data_cleaning_and_merging.ipynb does.
+    """
+    merged = pd.merge(collision, vehicle, on='accident_index', how='left')
+    return pd.merge(merged, casualty, on='accident_index', how='left')
+
+
+@pytest.fixture
+def sources():
+    return source_tables()
+
+
+@pytest.fixture
+def tables(sources):
+    return split_tables(apply_schema(merge(*sources)))
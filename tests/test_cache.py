@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from data.cache import CACHE_VERSION, FigureCache, MemoryFigureCache, SQLiteFigureCache, cache_key, open_figure_cache
+
+
+def payload_size(value):
+    """
+    Returns the bytes an entry takes in a cache.
+    """
+    cache = MemoryFigureCache()
+    cache.put('size', value)
+    return cache.nbytes
+
+
+def test_cache_key_normalizes_inputs():
+    assert cache_key('map', ['Fatal', 'Serious'], None) == ('map', ('Fatal', 'Serious'), None)
+    assert cache_key('map', {'b', 'a'}) == cache_key('map', {'a', 'b'}) == ('map', ('a', 'b'))
+    assert hash(cache_key('map', [('month', ['May'])]))
+
+
+def test_figure_cache_is_abstract():
+    with pytest.raises(TypeError):
+        FigureCache()
+
+
+def test_memory_cache_evicts_the_least_recently_used_entries():
+    value = ['x' * 100]
+    cache = MemoryFigureCache(max_bytes=3 * payload_size(value))
+    for key in 'abc':
+        cache.put(key, value)
+    assert cache.get('a') == value  # 'a' is now the most recently used
+    cache.put('d', value)
+
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == [value] * 3
+    assert cache.stats()['entries'] == 3 and cache.nbytes <= cache.max_bytes
+    # Outputs larger than the budget are not stored
+    cache.put('e', ['x' * 1000])
+    assert cache.get('e') is None and cache.get('d') == value
+
+
+def test_cached_builds_once():
+    cache = MemoryFigureCache()
+    builds = []
+    for _ in range(3):
+        assert cache.cached('key', lambda: builds.append(1) or [len(builds)]) == [1]
+    assert len(builds) == 1 and cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+
+def test_sqlite_namespaces_do_not_share_entries(tmp_path):
+    path = str(tmp_path / 'figures.sqlite')
+    first, second = SQLiteFigureCache('first', path=path), SQLiteFigureCache('second', path=path)
+    first.put('key', [1])
+    second.put('key', [2])
+
+    assert first.get('key') == [1] and second.get('key') == [2]
+    first.clear()
+    assert first.get('key') is None and second.get('key') == [2]
+
+
+def test_sqlite_evicts_beyond_the_budget_and_expires(tmp_path):
+    path = str(tmp_path / 'figures.sqlite')
+    value = ['x' * 100]
+    cache = SQLiteFigureCache(max_bytes=3 * payload_size(value), path=path)
+    for key in 'abcd':
+        cache.put(key, value)
+        time.sleep(0.01)  # Entries are ordered by their access time
+
+    assert cache.get('a') is None
+    assert [cache.get(key) for key in 'bcd'] == [value] * 3
+    assert cache.stats()['bytes'] <= cache.max_bytes
+
+    expired = SQLiteFigureCache(path=path, ttl=0)
+    time.sleep(0.01)
+    assert expired.get('b') is None
+
+
+def test_open_figure_cache_versions_the_namespace(monkeypatch):
+    monkeypatch.setenv('FIGURE_CACHE', 'memory')
+    cache = open_figure_cache(namespace='dataset')
+    assert isinstance(cache, MemoryFigureCache)
+    assert cache.namespace == f'v{CACHE_VERSION}/dataset'
+
+    monkeypatch.setenv('FIGURE_CACHE', 'redis')
+    with pytest.raises(ValueError):
+        open_figure_cache()
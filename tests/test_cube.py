@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.cube import DataCube
+from data.index import FILTER_COLUMNS
+from data.schema import MONTHS, SEVERITIES
+
+
+def random_collisions(rows=3000, seed=0):
+    """
+    Builds collisions with random labels in every filter column, some of them missing, including collisions
+    without a local authority or a month.
+    """
+    rng = np.random.default_rng(seed)
+    labels = {column: [f'{column} {i}' for i in range(4)] for column in FILTER_COLUMNS}
+    labels.update({'accident_severity': SEVERITIES, 'month': MONTHS,
+                   'local_authority_ons_district': [f'E0600000{i}' for i in range(8)]})
+    data = pd.DataFrame({column: pd.Categorical.from_codes(rng.integers(-1, len(values), rows), categories=values)
+                         for column, values in labels.items()})
+    data['accident_severity'] = pd.Categorical.from_codes(rng.integers(0, 3, rows), categories=SEVERITIES)
+    data['latitude'] = np.where(rng.random(rows) < 0.05, np.nan, rng.uniform(50, 58, rows))
+    data['longitude'] = rng.uniform(-6, 2, rows)
+    data['number_of_casualties'] = rng.integers(1, 5, rows)
+    return data, labels
+
+
+def random_selections(rng, labels):
+    """
+    Picks a random selection of every filter column: nothing, one label, several labels or a month range.
+    """
+    selections = []
+    for column, values in labels.items():
+        kind = rng.integers(4)
+        if kind == 1:
+            selections.append((column, str(rng.choice(values))))
+        elif kind == 2:
+            selections.append((column, list(rng.choice(values + ['not a label'], rng.integers(1, 4), replace=False))))
+        elif kind == 3 and column == 'month':
+            start = rng.integers(12)
+            selections.append((column, MONTHS[start:rng.integers(start, 12) + 1]))
+    return selections
+
+
+def selected_rows(data, selections):
+    """
+    Finds the rows matching all selections with pandas.
+    """
+    mask = np.ones(len(data), dtype=bool)
+    for column, values in selections:
+        mask &= data[column].isin([values] if isinstance(values, str) else values).to_numpy()
+    return data[mask]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_total_and_aggregate_match_a_groupby(seed):
+    data, labels = random_collisions(seed=seed)
+    cube = DataCube(data)
+    rng = np.random.default_rng(seed)
+
+    for _ in range(40):
+        # Half of the selections only use the dimensions of the prefix sums, the others also the tree map columns
+        selections = random_selections(rng, labels)
+        if rng.random() < 0.5:
+            selections = [(column, values) for column, values in selections
+                          if column in ['local_authority_ons_district', 'accident_severity', 'month']]
+        rows = selected_rows(data, selections)
+
+        # The totals count every selected collision, those without a local authority too
+        assert cube.total(selections) == rows['number_of_casualties'].sum(), selections
+        assert cube.total(selections, measure='count') == len(rows), selections
+
+        expected = rows.groupby('local_authority_ons_district', observed=True).agg(
+            latitude=('latitude', 'mean'), longitude=('longitude', 'mean'),
+            number_of_casualties=('number_of_casualties', 'sum'),
+            accident_severity=('accident_severity', lambda severity: severity.mode()[0]))
+        result = cube.aggregate(selections).set_index('local_authority_ons_district')
+        assert list(result.index) == list(expected.index), selections
+        np.testing.assert_allclose(result['latitude'], expected['latitude'])
+        np.testing.assert_allclose(result['longitude'], expected['longitude'])
+        assert (result['number_of_casualties'].to_numpy() == expected['number_of_casualties'].to_numpy()).all()
+        assert list(result['accident_severity']) == list(expected['accident_severity'])
+
+
+def test_total_counts_collisions_without_a_local_authority():
+    data, _ = random_collisions()
+    cube = DataCube(data)
+    missing = data['local_authority_ons_district'].isna()
+
+    assert missing.any()
+    assert cube.total({}) == data['number_of_casualties'].sum()
+    assert (cube.total({}) - cube.aggregate({})['number_of_casualties'].sum() ==
+            data.loc[missing, 'number_of_casualties'].sum())
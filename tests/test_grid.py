@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from data.grid import GridPyramid
+
+
+def random_collisions(rows=2000, seed=0):
+    """
+    Builds collisions spread over Great Britain with random severities and casualties.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'latitude': rng.uniform(50, 58, rows), 'longitude': rng.uniform(-6, 2, rows),
+                         'accident_severity': pd.Categorical(rng.choice(['Fatal', 'Serious', 'Slight'], rows)),
+                         'number_of_casualties': rng.integers(1, 4, rows)})
+
+
+def test_cells_of_a_selection_are_grouped_once_per_level():
+    data = random_collisions()
+    grid = GridPyramid(data)
+    mask = (data['accident_severity'] == 'Serious').to_numpy()
+
+    for level in [6, 10, 16]:
+        for bounds in [None, [-2, 51, 0, 53], [-1.5, 51.5, 0.5, 53.5]]:
+            expected = grid.cells(mask, bounds, level)
+            assert grid.cells(mask, bounds, level, selection='serious').equals(expected)
+        assert grid.cells(mask, None, level, selection='serious')['count'].sum() == mask.sum()
+    # Panning reuses the grouping of the level
+    assert len(grid._selections) == 3
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.index import BitmapIndex
+from data.schema import MONTHS, SEVERITIES
+
+
+def random_collisions(rows=5000, seed=0, sort_months=True):
+    """
+    Builds collisions with a common severity, a rare local authority, a month and a few missing labels.
+    """
+    rng = np.random.default_rng(seed)
+    month = rng.integers(-1, 12, rows)
+    if sort_months:
+        # Like sort_by_date, with missing months last
+        month = np.sort(np.where(month < 0, 12, month))
+        month = np.where(month == 12, -1, month)
+    authorities = [f'E0600{i:04d}' for i in range(200)]
+    return pd.DataFrame({
+        'month': pd.Categorical.from_codes(month, categories=MONTHS),
+        'accident_severity': pd.Categorical.from_codes(rng.choice(3, rows, p=[0.05, 0.25, 0.7]),
+                                                       categories=SEVERITIES),
+        'local_authority_ons_district': pd.Categorical.from_codes(rng.integers(-1, 200, rows), categories=authorities),
+    })
+
+
+def as_mask(rows, length):
+    """
+    Converts a query result, row ids or a packed bitmap, to a boolean mask.
+    """
+    if rows.dtype == np.int32:
+        mask = np.zeros(length, dtype=bool)
+        mask[rows] = True
+        return mask
+    return np.unpackbits(rows, count=length).view(bool)
+
+
+@pytest.mark.parametrize('sort_months', [True, False])
+def test_masks_match_a_pandas_filter(sort_months):
+    data = random_collisions(sort_months=sort_months)
+    index = BitmapIndex(data, columns=list(data.columns))
+    assert ('month' in index.offsets) == sort_months
+    # Rare labels are stored as row ids, common ones as bitmaps
+    kinds = {posting.dtype for postings in index.postings.values() for posting in postings}
+    assert kinds == {np.dtype(np.int32), np.dtype(np.uint8)}
+
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        selections = {}
+        if rng.random() < 0.6:
+            start = rng.integers(12)
+            selections['month'] = MONTHS[start:rng.integers(start, 12) + 1]
+        elif rng.random() < 0.5:
+            # Months that are not consecutive are answered from the postings
+            selections['month'] = list(rng.choice(MONTHS, 3, replace=False))
+        if rng.random() < 0.5:
+            selections['accident_severity'] = list(rng.choice(SEVERITIES, rng.integers(1, 3), replace=False))
+        if rng.random() < 0.5:
+            authorities = data['local_authority_ons_district'].cat.categories
+            selections['local_authority_ons_district'] = list(rng.choice(authorities, 3))
+
+        expected = np.ones(len(data), dtype=bool)
+        for column, values in selections.items():
+            expected &= data[column].isin(values).to_numpy()
+        assert np.array_equal(index.mask(selections), expected), selections
+        rows = index.query(selections)
+        if rows is not None:
+            assert np.array_equal(as_mask(rows, len(data)), expected), selections
+
+
+def test_month_ranges_are_slices_of_sorted_rows():
+    data = random_collisions()
+    index = BitmapIndex(data, columns=['month'])
+
+    start, stop = index._range('month', MONTHS[2:6])
+    months = data['month'].cat.codes.to_numpy()
+    assert (months[start:stop] >= 2).all() and (months[start:stop] < 6).all()
+    assert stop - start == data['month'].isin(MONTHS[2:6]).sum()
+    # Empty selections select every row, labels that do not occur none
+    assert index.mask({'month': []}).all() and index.query({'month': None}) is None
+    assert not index.mask({'month': 'Smarch'}).any()
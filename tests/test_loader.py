@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.index import BitmapIndex
+from data.loader import CSV_PATH, add_date_columns, has_columnar, load_tables, sort_by_date
+from data.tables import CollisionTables
+
+
+def two_year_tables():
+    """
+    Builds tables of collisions over two years in file order, each with one vehicle and one casualty.
+    """
+    dates = ['15/03/2021', '02/01/2022', '20/03/2022', '05/01/2021', None, '30/12/2021', '01/03/2021']
+    collisions = pd.DataFrame({'date': dates, 'time': ['08:30'] * len(dates)})
+    vehicles = pd.DataFrame({'collision_id': np.arange(len(dates), dtype=np.int32)})
+    casualties = pd.DataFrame({'collision_id': np.arange(len(dates), dtype=np.int32),
+                               'vehicle_id': np.arange(len(dates), dtype=np.int32)})
+    return CollisionTables(collisions, vehicles, casualties)
+
+
+def test_sort_by_date_keeps_each_month_contiguous_across_years():
+    tables = sort_by_date(two_year_tables())
+    add_date_columns(tables.collisions)
+
+    months = tables.collisions['month'].cat.codes.to_numpy()
+    assert (np.diff(np.where(months < 0, 12, months)) >= 0).all()
+    assert tables.collisions['date'].isna().to_numpy()[-1]
+    # Within a month the collisions are in date order
+    march = tables.collisions.loc[months == 2, 'date']
+    assert march.is_monotonic_increasing and march.dt.year.tolist() == [2021, 2021, 2022]
+    # Vehicles and casualties follow their collision
+    assert (tables.vehicles['collision_id'].to_numpy() == np.arange(len(months))).all()
+    assert (tables.casualties['vehicle_id'].to_numpy() == np.arange(len(months))).all()
+
+    index = BitmapIndex(tables.collisions, columns=['month'])
+    assert 'month' in index.offsets
+    assert index._range('month', ['January', 'February', 'March']) == (0, 5)
+    assert index.mask({'month': ['January', 'February', 'March']}).tolist() == [True] * 5 + [False] * 2
+
+
+def test_sort_by_date_returns_sorted_tables_as_they_are():
+    tables = sort_by_date(two_year_tables())
+    assert sort_by_date(tables) is tables
+
+
+@pytest.mark.skipif(not (has_columnar() or os.path.isfile(CSV_PATH)), reason='dataset not present')
+def test_loaded_collisions_have_month_offsets():
+    tables = load_tables()
+    assert 'month' in BitmapIndex(tables.collisions).offsets
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_add_date_columns_gives_a_datetime_column(categorical):
+    tables = two_year_tables()
+    if categorical:
+        # The columnar build loads the dates as a Categorical of strings
+        tables.collisions['date'] = tables.collisions['date'].astype('category')
+    data = add_date_columns(tables.collisions)
+
+    assert data['date'].dtype == 'datetime64[ns]'
+    assert data['date'].min() == pd.Timestamp('2021-01-05')
+    assert data['month'].cat.codes.tolist() == [2, 0, 2, 0, -1, 11, 2]
+    assert data['day_of_year'].tolist() == [74, 2, 79, 5, 0, 364, 60]
@@ -0,0 +1,52 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from data.pairs import PairCounts, count_pairs, read_pair_counts
+from data.schema import SEVERITIES
+
+COLUMNS = ['vehicle_type', 'junction_location', 'casualty_class']
+
+
+def groupby_matrix(tables, x, y, local_authority=None, severity=None, drop=()):
+    """
+    Counts the label pairs of two columns with a groupby over the rows at their finest grain.
+    """
+    data = tables.frame([x, y, 'local_authority_ons_district', 'accident_severity'])
+    if local_authority is not None:
+        data = data[data['local_authority_ons_district'] == local_authority]
+    if severity is not None:
+        data = data[data['accident_severity'] == severity]
+    data = data[~data[x].isin(drop) & ~data[y].isin(drop)]
+    if x == y:
+        return data[x].value_counts()
+    return data.groupby([y, x], observed=True).size()
+
+
+@pytest.mark.parametrize('x, y', list(itertools.product(COLUMNS, repeat=2)))
+def test_matrix_matches_a_groupby(tables, x, y):
+    pairs = count_pairs(tables, COLUMNS)
+    for local_authority, severity, drop in itertools.product([None, 'E06000001', 'Northumberland'],
+                                                             [None] + SEVERITIES, [(), ('Car', 'Passenger')]):
+        matrix, x_labels, y_labels = pairs.matrix(x, y, local_authority, severity, drop)
+        expected = groupby_matrix(tables, x, y, local_authority, severity, drop)
+        if x == y:
+            assert np.array_equal(np.diag(matrix), expected[list(x_labels)].to_numpy())
+            assert matrix.sum() == expected.sum()
+            continue
+        assert matrix.sum() == expected.sum(), (local_authority, severity, drop)
+        for (j, label_y), (i, label_x) in itertools.product(enumerate(y_labels), enumerate(x_labels)):
+            assert matrix[j, i] == expected.get((label_y, label_x), 0)
+        assert not set(drop) & (set(x_labels) | set(y_labels))
+
+
+def test_save_and_read_give_the_same_counts(tables, tmp_path):
+    pairs = count_pairs(tables, COLUMNS)
+    pairs.save(tmp_path / 'pairs.npz')
+    read = read_pair_counts(tmp_path / 'pairs.npz')
+
+    assert isinstance(read, PairCounts) and read.memory_usage() == pairs.memory_usage()
+    for x, y in itertools.combinations(COLUMNS, 2):
+        for expected, actual in zip(pairs.matrix(x, y, severity='Slight'), read.matrix(x, y, severity='Slight')):
+            assert np.array_equal(np.asarray(expected), np.asarray(actual))
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+
+def counts(data, columns):
+    """
+    Counts the rows of every combination of the columns with a groupby, missing values included.
+    """
+    data = data[columns].astype(object).fillna('missing')
+    return data.groupby(columns).size().sort_index()
+
+
+def test_split_keeps_every_collision_vehicle_and_casualty_once(sources, tables):
+    collision, vehicle, casualty = sources
+
+    assert len(tables.collisions) == len(collision)
+    assert len(tables.vehicles) == len(vehicle)
+    assert len(tables.casualties) == len(casualty)
+    assert tables.casualties['number_of_casualties'].sum() == len(casualty)
+    # Codes the notebook did not decode get their names from the schema
+    authorities = tables.collisions['local_authority_ons_district']
+    assert 'Northumberland' in authorities.cat.categories and 'E06000057' not in authorities.cat.categories
+    # The number of casualties of a vehicle counts the casualties that refer to it
+    keys = ['accident_index', 'vehicle_reference']
+    per_vehicle = casualty.groupby(keys).size().rename('expected')
+    expected = vehicle.join(per_vehicle, on=keys)['expected'].fillna(0).astype(int)
+    actual = pd.DataFrame({
+        'accident_index': tables.collisions['accident_index'].to_numpy()[tables.vehicles['collision_id'].to_numpy()],
+        'vehicle_reference': tables.vehicles['vehicle_reference'].astype(int),
+        'actual': tables.vehicles['number_of_casualties']})
+    compared = vehicle.assign(expected=expected).merge(actual, on=keys)
+    assert len(compared) == len(vehicle) and (compared['expected'] == compared['actual']).all()
+
+
+def test_frame_counts_at_the_finest_grain(sources, tables):
+    collision, vehicle, casualty = sources
+    severity = collision[['accident_index', 'accident_severity']]
+
+    # Vehicles with the severity of their collision
+    expected = counts(vehicle.merge(severity, on='accident_index'), ['vehicle_type', 'accident_severity'])
+    assert counts(tables.frame(['vehicle_type', 'accident_severity']),
+                  ['vehicle_type', 'accident_severity']).equals(expected)
+
+    # Casualties with the type of the vehicle they refer to, missing when it is not in the data
+    linked = casualty.merge(vehicle, on=['accident_index', 'vehicle_reference'], how='left')
+    expected = counts(linked, ['casualty_class', 'vehicle_type'])
+    assert counts(tables.frame(['casualty_class', 'vehicle_type']), ['casualty_class', 'vehicle_type']).equals(expected)
+
+    # A mask over the collisions keeps the vehicles of the selected collisions only
+    mask = (tables.collisions['accident_severity'] == 'Slight').to_numpy()
+    selected = vehicle.merge(severity[severity['accident_severity'] == 'Slight'], on='accident_index')
+    assert counts(tables.frame(['vehicle_type'], mask), ['vehicle_type']).equals(counts(selected, ['vehicle_type']))
+    assert tables.grain(['vehicle_type', 'casualty_class']) == 'casualty'
+    assert tables.grain(['accident_severity']) == 'collision'
+
+
+def test_sort_collisions_keeps_the_links(tables):
+    before = tables.frame(['accident_index', 'vehicle_type', 'casualty_class'])
+    order = np.random.default_rng(1).permutation(len(tables.collisions))
+    after = tables.sort_collisions(order).frame(['accident_index', 'vehicle_type', 'casualty_class'])
+
+    key = ['accident_index', 'vehicle_type', 'casualty_class']
+    assert counts(after, key).equals(counts(before, key))
+    assert (tables.sort_collisions(order).collisions['accident_index'].to_numpy() ==
+            tables.collisions['accident_index'].to_numpy()[order]).all()
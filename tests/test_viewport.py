@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.schema import SEVERITIES
+from data.viewport import authority_viewports, decimate
+
+
+def random_collisions(rows=20000, seed=0):
+    """
+    Builds collisions clustered around a few towns, some of them without coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    towns = rng.uniform([-4, 51], [0, 55], size=(20, 2))
+    town = rng.integers(0, len(towns), rows)
+    longitude, latitude = (towns[town] + rng.normal(0, 0.05, (rows, 2))).T
+    latitude[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        'latitude': latitude, 'longitude': longitude,
+        'accident_severity': pd.Categorical.from_codes(rng.choice(3, rows, p=[0.02, 0.2, 0.78]),
+                                                       categories=SEVERITIES),
+        'number_of_casualties': rng.integers(1, 5, rows),
+        'local_authority_ons_district': pd.Categorical.from_codes(np.where(rng.random(rows) < 0.02, -1, town % 7),
+                                                                  categories=[f'E0600000{i}' for i in range(7)]),
+    })
+
+
+def in_bounds(data, bounds):
+    """
+    Filters the rows within the bounds with pandas.
+    """
+    west, south, east, north = bounds
+    return data[data['longitude'].between(west, east) & data['latitude'].between(south, north)]
+
+
+@pytest.mark.parametrize('bounds', [None, [-3, 52, -1, 54], [10, 10, 11, 11]])
+def test_decimate_keeps_the_fatal_collisions_in_view_within_the_budget(bounds):
+    data = random_collisions()
+    visible = data.dropna(subset=['latitude', 'longitude']) if bounds is None else in_bounds(data, bounds)
+    fatal = visible[visible['accident_severity'] == 'Fatal']
+
+    result = decimate(data, bounds, max_points=500)
+    assert result.index.isin(visible.index).all() and result.index.is_monotonic_increasing
+    assert fatal.index.isin(result.index).all()
+    assert (result['accident_severity'] != 'Fatal').sum() <= 500
+    if len(visible) > 500:
+        # Every severity in view stays visible
+        assert set(result['accident_severity'].unique()) == set(visible['accident_severity'].unique())
+    # Below the budget every collision in view is kept
+    assert decimate(data, bounds, max_points=len(data)).index.equals(visible.index)
+
+
+def test_authority_viewports_match_groupby_quantiles():
+    data = random_collisions()
+    trim = 0.05
+    viewports = authority_viewports(data, trim=trim)
+
+    located = data.dropna(subset=['latitude', 'longitude', 'local_authority_ons_district'])
+    groups = located.groupby('local_authority_ons_district', observed=True)
+    assert list(viewports.index) == list(groups.groups)
+    for edge, column, q, method in [('south', 'latitude', trim, 'lower'), ('north', 'latitude', 1 - trim, 'higher'),
+                                    ('west', 'longitude', trim, 'lower'), ('east', 'longitude', 1 - trim, 'higher')]:
+        expected = groups[column].quantile(q, interpolation=method)
+        np.testing.assert_allclose(viewports[edge].to_numpy(), expected.to_numpy())
+    np.testing.assert_allclose(viewports['latitude'], (viewports['south'] + viewports['north']) / 2)
+    assert (viewports['zoom'] <= 15).all()